@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+E-Paper 디스플레이 데몬
+
+EPD 드라이버 객체와 팔레트 테이블을 메모리에 유지하는 상주 서비스입니다.
+Unix 소켓으로 이미지 경로나 패킹된 패널 버퍼를 받아 한 번에 하나씩 표시하므로,
+cron 작업이나 다른 스크립트는 파이썬 시작과 cv2/numpy/PIL 로드, 하드웨어 탐지 비용 없이
+표시를 요청할 수 있습니다.
+
+요청/응답은 한 줄짜리 JSON입니다.
+    {"image": "/abs/path.png", "portrait": false, "dither": "pil", ...}
+    {"buffer": "/abs/path.bin"}
+    -> {"ok": true, "refreshed": true, "superseded": false} 또는 {"ok": false, "error": "..."}
+
+패널 갱신은 최소 간격을 두고 하나씩 진행되며, 갱신 중이거나 대기 중에 들어온 요청은
+가장 최근 프레임 하나만 남기고 이전 대기 프레임은 "superseded"로 응답합니다.
+"""
+
+import argparse
+import contextlib
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from e_Paper import epdbuf
+
+# 상수 정의
+DEFAULT_SOCKET_PATH = os.environ.get("JIHWA_EPD_SOCKET", "/tmp/jihwa-epd.sock")
+DEFAULT_TIMEOUT = 300  # 초, 갱신 대기 포함
+DEFAULT_MIN_INTERVAL = 180  # 초, 7색 패널 갱신 사이 권장 최소 간격
+SOCKET_MODE = 0o660
+
+# 로깅 설정
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+class RefreshTicket:
+    """
+    갱신 대기열에 제출된 프레임 하나와 그 결과
+    """
+
+    def __init__(self, buffer: Any, force: bool):
+        self.buffer = buffer
+        self.force = force
+        self.done = threading.Event()
+        self.result: Dict[str, Any] = {}
+        self.error: Optional[BaseException] = None
+
+    def resolve(self, result: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None) -> None:
+        self.result = result or {}
+        self.error = error
+        self.done.set()
+
+    def wait(self) -> Dict[str, Any]:
+        """
+        프레임이 표시되거나 더 새로운 프레임으로 대체될 때까지 기다립니다.
+
+        Returns:
+            {"refreshed": bool, "superseded": bool}
+
+        Raises:
+            Exception: 갱신 중 발생한 오류
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class RefreshCoordinator:
+    """
+    패널 갱신을 한 번에 하나씩, 최소 간격을 지켜 실행하는 조정자
+
+    대기 중인 프레임은 하나만 유지합니다. 갱신이 진행 중이거나 최소 간격을 기다리는 동안
+    새 프레임이 들어오면 이전 대기 프레임은 표시되지 않고 "superseded"로 끝나므로,
+    연달아 들어온 요청은 패널 갱신 한 번으로 합쳐집니다.
+    """
+
+    def __init__(self, refresh: Callable[[Any, bool], bool], min_interval: float = DEFAULT_MIN_INTERVAL):
+        self.refresh = refresh
+        self.min_interval = min_interval
+        self.condition = threading.Condition()
+        self.pending: Optional[RefreshTicket] = None
+        self.last_refresh: Optional[float] = None
+        self.worker = threading.Thread(target=self.run, name="refresh-coordinator", daemon=True)
+        self.worker.start()
+
+    def submit(self, buffer: Any, force: bool = False) -> RefreshTicket:
+        """
+        프레임을 갱신 대기열에 넣습니다. 이미 대기 중인 프레임이 있으면 대체합니다.
+
+        Args:
+            buffer: 패킹된 패널 버퍼 (결과가 나올 때까지 유효해야 함)
+            force: 화면에 이미 같은 프레임이 있어도 강제로 갱신
+
+        Returns:
+            결과를 기다릴 RefreshTicket
+        """
+        ticket = RefreshTicket(buffer, force)
+        with self.condition:
+            if self.pending is not None:
+                logger.info("Dropping the pending frame: superseded by a newer request.")
+                self.pending.resolve({"refreshed": False, "superseded": True})
+            self.pending = ticket
+            self.condition.notify()
+        return ticket
+
+    def holdoff(self) -> float:
+        if self.last_refresh is None:
+            return 0.0
+        return self.last_refresh + self.min_interval - time.monotonic()
+
+    def next_ticket(self) -> RefreshTicket:
+        with self.condition:
+            while True:
+                if self.pending is None:
+                    self.condition.wait()
+                    continue
+                wait = self.holdoff()
+                if wait <= 0:
+                    ticket, self.pending = self.pending, None
+                    return ticket
+                logger.info(f"Holding the next refresh for {wait:.0f} s (minimum interval {self.min_interval} s)")
+                self.condition.wait(wait)
+
+    def run(self) -> None:
+        while True:
+            ticket = self.next_ticket()
+            try:
+                refreshed = self.refresh(ticket.buffer, ticket.force)
+            except Exception as e:
+                ticket.resolve(error=e)
+                continue
+            if refreshed:
+                self.last_refresh = time.monotonic()
+            ticket.resolve({"refreshed": refreshed, "superseded": False})
+
+
+class DisplayService:
+    """
+    EPD 드라이버를 유지하면서 표시 요청을 직렬로 처리하는 서비스
+    """
+
+    def __init__(self, epd_type: str, state_file: str, min_interval: float = DEFAULT_MIN_INTERVAL):
+        # 무거운 모듈(cv2, numpy, PIL, epdconfig 하드웨어 탐지)은 데몬 시작 시 한 번만 로드
+        import display_picture
+
+        self.display = display_picture
+        self.epd_type = epd_type
+        self.state_file = state_file
+        self.epd = display_picture.load_epd(epd_type)
+        self.coordinator = RefreshCoordinator(self.refresh, min_interval)
+
+        display_picture.panel_lut(self.epd)
+        logger.info(f"Display service ready: {epd_type} ({self.epd.width}x{self.epd.height})")
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        표시 요청 하나를 처리합니다. 렌더링은 요청마다 바로 진행하고, 패널 갱신은 조정자가
+        최소 간격을 지켜 가장 최근 프레임만 표시합니다.
+
+        Args:
+            request: 요청 딕셔너리 ("image" 또는 "buffer" 키 필수)
+
+        Returns:
+            응답 딕셔너리
+
+        Raises:
+            ValueError: 요청 형식이 잘못된 경우
+        """
+        if "buffer" not in request and "image" not in request:
+            raise ValueError("Request needs an 'image' or 'buffer' path")
+
+        with contextlib.ExitStack() as stack:
+            start = time.perf_counter()
+            if "buffer" in request:
+                buffer = stack.enter_context(self.map_buffer(request["buffer"]))
+            else:
+                buffer = self.render(request)
+            # 매핑된 버퍼는 결과가 나올 때까지(표시되거나 대체될 때까지) 유지
+            result = self.coordinator.submit(buffer, bool(request.get("force", False))).wait()
+            elapsed = time.perf_counter() - start
+
+        return {"ok": True, **result, "seconds": round(elapsed, 3)}
+
+    def refresh(self, buffer: Any, force: bool) -> bool:
+        return self.display.refresh_display(self.epd, buffer, epd_type=self.epd_type, force=force,
+                                            state_file=self.state_file)
+
+    @contextlib.contextmanager
+    def map_buffer(self, path: str) -> Iterator[memoryview]:
+        """
+        미리 패킹된 패널 버퍼 파일(.epdbuf 또는 헤더 없는 원시 버퍼)을 메모리 매핑하고 검증합니다.
+
+        Args:
+            path: 버퍼 파일 경로
+
+        Yields:
+            복사 없이 SPI로 스트리밍할 수 있는 페이로드 memoryview
+
+        Raises:
+            ValueError: 버퍼가 패널 모델이나 크기와 맞지 않는 경우
+        """
+        with epdbuf.mapped(path) as (info, buffer):
+            if info is not None and info.model != self.epd_type:
+                raise ValueError(f"Buffer was rendered for {info.model}, not {self.epd_type}")
+            expected = self.epd.width * self.epd.height * getattr(self.epd, "bpp", 4) // 8
+            if len(buffer) != expected:
+                raise ValueError(f"Buffer {path} has {len(buffer)} bytes, expected {expected}")
+            yield buffer
+
+    def render(self, request: Dict[str, Any]) -> bytes:
+        """
+        이미지 요청을 display_picture.py와 같은 방식으로 처리해 패널 버퍼로 만듭니다.
+
+        Args:
+            request: 이미지 요청 딕셔너리
+
+        Returns:
+            패킹된 패널 버퍼
+        """
+        dp = self.display
+        disp_w = int(request.get("width", dp.DEFAULT_WIDTH))
+        disp_h = int(request.get("height", dp.DEFAULT_HEIGHT))
+        if request.get("portrait", False):
+            disp_w, disp_h = disp_h, disp_w
+
+        image = dp.load_image(request["image"])
+        image = dp.process_image(image, disp_w, disp_h,
+                                 resize_only=bool(request.get("resize_only", False)),
+                                 centre_crop=bool(request.get("centre_crop", False)))
+        return dp.render_buffer(self.epd, image,
+                                dither=request.get("dither", dp.DEFAULT_DITHER),
+                                palette=request.get("palette", dp.DEFAULT_PALETTE),
+                                color_match=request.get("color_match", dp.DEFAULT_COLOR_MATCH))
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    소켓 연결 하나에서 JSON 요청 한 줄을 읽고 응답 한 줄을 씁니다.
+    """
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            if not isinstance(request, dict):
+                raise ValueError("Request must be a JSON object")
+            response = self.server.service.handle(request)
+        except Exception as e:
+            logger.error(f"Request failed: {e}")
+            response = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class DisplayServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: DisplayService):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # 이전 실행이 남긴 소켓 파일
+        super().__init__(socket_path, RequestHandler)
+        os.chmod(socket_path, SOCKET_MODE)
+        self.service = service
+
+
+def serve(socket_path: str, epd_type: str, state_file: str, min_interval: float = DEFAULT_MIN_INTERVAL) -> None:
+    """
+    데몬을 시작하고 종료될 때까지 요청을 처리합니다.
+
+    Args:
+        socket_path: Unix 소켓 경로
+        epd_type: Waveshare 디스플레이 타입
+        state_file: 마지막 프레임 다이제스트 상태 파일
+        min_interval: 패널 갱신 사이 최소 간격 (초)
+    """
+    service = DisplayService(epd_type, state_file, min_interval)
+    with DisplayServer(socket_path, service) as server:
+        logger.info(f"Listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Shutting down display service.")
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+def send_request(request: Dict[str, Any], socket_path: str = DEFAULT_SOCKET_PATH,
+                 timeout: float = DEFAULT_TIMEOUT) -> Dict[str, Any]:
+    """
+    데몬에 요청을 보내고 응답을 기다립니다.
+
+    Args:
+        request: 요청 딕셔너리
+        socket_path: Unix 소켓 경로
+        timeout: 응답 대기 시간 (초)
+
+    Returns:
+        응답 딕셔너리
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as stream:
+            return json.loads(stream.readline())
+
+
+def parse_arguments() -> Dict[str, Any]:
+    """
+    명령줄 인수를 파싱합니다.
+
+    Returns:
+        파싱된 명령줄 인수 딕셔너리
+    """
+    parser = argparse.ArgumentParser(
+        description="Resident e-Paper display service and its client.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "--socket",
+        default=DEFAULT_SOCKET_PATH,
+        help="Unix socket path of the display service"
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        default=False,
+        help="Enable debug logging"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the display service")
+    serve_parser.add_argument(
+        "--epd",
+        default="epd7in3f",
+        help="Waveshare EPD module type to use (e.g., epd7in3f)"
+    )
+    serve_parser.add_argument(
+        "--state_file",
+        default=os.path.expanduser("~/.cache/jihwa/epd_state.json"),
+        help="File storing the digest of the last displayed frame"
+    )
+    serve_parser.add_argument(
+        "--min_interval",
+        type=float,
+        default=DEFAULT_MIN_INTERVAL,
+        help="Minimum seconds between panel refreshes; requests arriving meanwhile are coalesced (0 to disable)"
+    )
+
+    show_parser = commands.add_parser("show", help="Ask the running service to display an image")
+    show_parser.add_argument(
+        "path",
+        help="Image file, or packed panel buffer (.epdbuf or raw) with --buffer"
+    )
+    show_parser.add_argument("--buffer", action="store_true", default=False,
+                             help="Path is a pre-packed panel buffer")
+    show_parser.add_argument("-p", "--portrait", action="store_true", default=False,
+                             help="Set to portrait mode")
+    show_parser.add_argument("-c", "--centre_crop", action="store_true", default=False,
+                             help="Use center crop instead of intelligent crop")
+    show_parser.add_argument("-r", "--resize_only", action="store_true", default=False,
+                             help="Simple resize to display dimensions ignoring aspect ratio")
+    show_parser.add_argument("-f", "--force", action="store_true", default=False,
+                             help="Refresh the display even if the same frame is already shown")
+    show_parser.add_argument("--dither", help="Dithering engine (service default if omitted)")
+    show_parser.add_argument("--palette", help="Panel palette name or JSON file")
+    show_parser.add_argument("--color_match", help="Colour space for nearest-colour matching")
+    show_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                             help="Seconds to wait for the refresh to finish")
+
+    return vars(parser.parse_args())
+
+
+def main() -> int:
+    """
+    메인 실행 함수
+
+    Returns:
+        종료 코드 (0: 성공, 1: 오류)
+    """
+    args = parse_arguments()
+
+    if args["debug"]:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if args["command"] == "serve":
+        try:
+            serve(args["socket"], args["epd"], args["state_file"], args["min_interval"])
+            return 0
+        except Exception as e:
+            logger.error(f"Display service failed: {e}")
+            return 1
+
+    path = os.path.abspath(args["path"])
+    request: Dict[str, Any] = {"buffer": path} if args["buffer"] else {"image": path}
+    for key in ("portrait", "centre_crop", "resize_only", "force"):
+        if args[key]:
+            request[key] = True
+    for key in ("dither", "palette", "color_match"):
+        if args[key]:
+            request[key] = args[key]
+
+    try:
+        response = send_request(request, args["socket"], args["timeout"])
+    except OSError as e:
+        logger.error(f"Cannot reach display service at {args['socket']}: {e}")
+        return 1
+
+    if not response.get("ok"):
+        logger.error(f"Display failed: {response.get('error')}")
+        return 1
+    if response.get("superseded"):
+        logger.info(f"Display request superseded by a newer frame ({response.get('seconds')} s)")
+        return 0
+    state = "refreshed" if response.get("refreshed") else "unchanged, refresh skipped"
+    logger.info(f"Display {state} ({response.get('seconds')} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
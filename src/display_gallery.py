@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+E-Paper 갤러리 월 (여러 패널 동시 갱신)
+
+한 호스트에 연결된 여러 e-Paper 패널에 이미지를 하나씩 표시합니다.
+패널마다 자체 RST/DC/BUSY/PWR 핀과 SPI 장치를 갖는 하드웨어 백엔드를 사용하고,
+프레임은 같은 SPI 버스에서 차례로 전송하되 약 30초의 갱신(BUSY) 구간은 겹쳐서 진행하므로
+N개 패널이 패널 하나를 갱신하는 시간과 비슷하게 끝납니다.
+
+패널 설정 파일(JSON)은 패널 목록입니다. 패널마다 RST/DC/BUSY/PWR 핀과 SPI 장치가 달라야 합니다.
+    [{"name": "left", "epd": "epd7in3f",
+      "pins": {"rst": 17, "dc": 25, "busy": 24, "pwr": 18}, "spi": {"device": 0}},
+     {"name": "right", "epd": "epd7in3f", "portrait": true,
+      "pins": {"rst": 5, "dc": 6, "busy": 13, "pwr": 19}, "spi": {"device": 1}}]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+import display_picture
+from e_Paper.epddither import DITHER_MODES, DEFAULT_DITHER
+
+# 상수 정의
+DEFAULT_PANELS_FILE = os.path.expanduser("~/.config/jihwa/panels.json")
+
+# 로깅 설정
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def load_panels(panels_file: str) -> List[Dict[str, Any]]:
+    """
+    패널 설정 파일을 읽고 검증합니다.
+
+    Args:
+        panels_file: 패널 설정 JSON 파일 경로
+
+    Returns:
+        패널 설정 딕셔너리 리스트
+
+    Raises:
+        ValueError: 설정 형식이 잘못되었거나 패널 이름이 중복된 경우
+    """
+    with open(panels_file, 'r', encoding='utf-8') as file:
+        panels = json.load(file)
+    if not isinstance(panels, list) or not panels:
+        raise ValueError(f"{panels_file} must hold a non-empty list of panels")
+
+    names = set()
+    for index, panel in enumerate(panels):
+        panel.setdefault("name", f"panel{index}")
+        panel.setdefault("epd", display_picture.DEFAULT_EPD_TYPE)
+        if panel["name"] in names:
+            raise ValueError(f"Duplicate panel name: {panel['name']}")
+        names.add(panel["name"])
+    return panels
+
+
+def check_wiring(panels: List[Dict[str, Any]]) -> None:
+    """
+    패널끼리 GPIO 핀이나 SPI 장치가 겹치지 않는지 확인합니다.
+    (백엔드는 패널마다 RST/DC/BUSY/PWR 핀을 점유하므로, 핀을 점유하기 전에 설정만으로 확인)
+
+    Args:
+        panels: 패널 설정 리스트
+
+    Raises:
+        ValueError: 두 패널이 같은 GPIO 핀이나 같은 SPI 장치를 쓰는 경우
+    """
+    from e_Paper import epdconfig
+
+    owners: Dict[Any, Tuple[str, str]] = {}
+    for panel in panels:
+        wiring = epdconfig.panel_wiring(panel.get("pins"), panel.get("spi"))
+        for name, value in wiring.items():
+            key = ("spi", value) if name == "spi" else ("gpio", value)
+            if key not in owners:
+                owners[key] = (panel["name"], name)
+                continue
+            other, other_name = owners[key]
+            if name == "spi":
+                raise ValueError(f"Panels {other} and {panel['name']} both use SPI bus {value[0]} device {value[1]}; "
+                                 f"give each panel its own \"spi\": {{\"device\": ...}}")
+            raise ValueError(f"GPIO {value} is used by both {other} ({other_name}) and {panel['name']} ({name}); "
+                             f"give each panel its own \"pins\" (rst, dc, busy, pwr)")
+
+
+def create_panel(panel: Dict[str, Any]) -> Any:
+    """
+    패널 설정에 맞는 하드웨어 백엔드를 가진 EPD 드라이버 객체를 생성합니다.
+
+    Args:
+        panel: 패널 설정 딕셔너리 (epd, pins, spi)
+
+    Returns:
+        EPD 드라이버 객체
+    """
+    from e_Paper import epdconfig, epdmodels
+    backend = epdconfig.get_backend(panel.get("pins"), panel.get("spi"))
+    return epdmodels.get_driver(panel["epd"])(backend=backend)
+
+
+def state_key(panel: Dict[str, Any]) -> str:
+    """
+    상태 파일에서 패널을 구분하는 키를 만듭니다.
+
+    Args:
+        panel: 패널 설정 딕셔너리
+
+    Returns:
+        "<epd>@<name>" 형태의 키
+    """
+    return f"{panel['epd']}@{panel['name']}"
+
+
+def display_gallery(panels: List[Dict[str, Any]], image_paths: List[str], dither: str = DEFAULT_DITHER,
+                    palette: str = display_picture.DEFAULT_PALETTE,
+                    color_match: str = display_picture.DEFAULT_COLOR_MATCH, resize_only: bool = False,
+                    centre_crop: bool = False, force: bool = False,
+                    state_file: str = display_picture.DEFAULT_STATE_FILE,
+                    metrics_log: str = display_picture.DEFAULT_METRICS_FILE) -> Dict[str, bool]:
+    """
+    패널마다 이미지를 처리해 버퍼를 만들고, 바뀐 패널만 동시에 갱신합니다.
+
+    Args:
+        panels: 패널 설정 리스트
+        image_paths: 패널 순서대로 표시할 이미지 경로
+        dither: 패널 색상 양자화에 사용할 디더링 방식
+        palette: 패널 팔레트 이름 또는 JSON 파일 경로
+        color_match: 최근접 색상 비교 공간 (rgb 또는 lab)
+        resize_only: 비율을 무시하고 디스플레이 크기로 리사이즈
+        centre_crop: 지능적 크롭 대신 중앙 크롭 사용
+        force: 화면에 이미 같은 프레임이 있어도 강제로 갱신
+        state_file: 패널별 마지막 프레임 다이제스트를 저장하는 파일
+        metrics_log: 패널별 단계 시간/추정 에너지를 추가할 파일 (빈 문자열이면 기록 안 함)
+
+    Returns:
+        패널 이름별 갱신 여부
+
+    Raises:
+        ValueError: 이미지 수가 패널 수와 다르거나 패널끼리 핀/SPI 장치가 겹치는 경우
+        RuntimeError: 하나 이상의 패널 갱신이 실패한 경우
+    """
+    from e_Paper import epdscheduler
+
+    if len(image_paths) != len(panels):
+        raise ValueError(f"Got {len(image_paths)} images for {len(panels)} panels")
+    check_wiring(panels)
+
+    state = display_picture.load_display_state(state_file)
+    jobs = []
+    digests = {}
+    refreshed = {}
+    for panel, image_path in zip(panels, image_paths):
+        epd = create_panel(panel)
+        disp_w, disp_h = epd.width, epd.height
+        if panel.get("portrait", False):
+            disp_w, disp_h = disp_h, disp_w
+
+        image = display_picture.load_image(image_path)
+        image = display_picture.process_image(image, disp_w, disp_h, resize_only=resize_only,
+                                              centre_crop=centre_crop)
+        buffer = display_picture.render_buffer(epd, image, dither=dither, palette=palette,
+                                               color_match=color_match)
+
+        digest = display_picture.buffer_digest(buffer)
+        if not force and state.get(state_key(panel), {}).get("digest") == digest:
+            logger.info(f"Panel {panel['name']}: frame unchanged, skipping refresh.")
+            refreshed[panel["name"]] = False
+            continue
+        digests[panel["name"]] = digest
+        jobs.append((panel["name"], epd, buffer))
+
+    results = epdscheduler.show_all(jobs) if jobs else {}
+    epds = {name: epd for name, epd, _ in jobs}
+
+    failed = []
+    for panel in panels:
+        name = panel["name"]
+        if name not in results:
+            continue
+        if isinstance(results[name], Exception):
+            logger.error(f"Panel {name} failed: {results[name]}")
+            failed.append(name)
+            continue
+        refreshed[name] = True
+        display_picture.log_refresh_metrics(epds[name], state_key(panel), metrics_log)
+        try:
+            display_picture.save_display_state(state_file, state_key(panel), digests[name])
+        except OSError as e:
+            logger.warning(f"Failed to save display state: {e}")
+
+    if failed:
+        raise RuntimeError(f"Failed to refresh panels: {', '.join(failed)}")
+    return refreshed
+
+
+def parse_arguments() -> Dict[str, Any]:
+    """
+    명령줄 인수를 파싱합니다.
+
+    Returns:
+        파싱된 명령줄 인수 딕셔너리
+    """
+    parser = argparse.ArgumentParser(
+        description="Display one image per panel on several e-Paper panels at once.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "images",
+        nargs="+",
+        help="Image files, one per panel in the order of the panels file"
+    )
+    parser.add_argument(
+        "--panels",
+        default=DEFAULT_PANELS_FILE,
+        help="JSON file listing the panels with their model, pins and SPI device"
+    )
+    parser.add_argument("-c", "--centre_crop", action="store_true", default=False,
+                        help="Use center crop instead of intelligent crop")
+    parser.add_argument("-r", "--resize_only", action="store_true", default=False,
+                        help="Simple resize to display dimensions ignoring aspect ratio")
+    parser.add_argument("-f", "--force", action="store_true", default=False,
+                        help="Refresh panels even if the same frame is already shown")
+    parser.add_argument("--dither", choices=DITHER_MODES, default=DEFAULT_DITHER,
+                        help="Dithering engine used to map colors to the panel palette")
+    parser.add_argument("--palette", default=display_picture.DEFAULT_PALETTE,
+                        help="Panel palette: 'ideal', 'measured' or a JSON file of [r, g, b] entries")
+    parser.add_argument("--color_match", choices=["rgb", "lab"], default=display_picture.DEFAULT_COLOR_MATCH,
+                        help="Colour space for nearest-colour matching")
+    parser.add_argument("--state_file", default=display_picture.DEFAULT_STATE_FILE,
+                        help="File storing the digest of the last displayed frame per panel")
+    parser.add_argument("--metrics_log", default=display_picture.DEFAULT_METRICS_FILE,
+                        help="JSON Lines file receiving per-refresh phase timings and estimated energy")
+    parser.add_argument("--debug", action="store_true", default=False,
+                        help="Enable debug logging")
+
+    return vars(parser.parse_args())
+
+
+def main() -> int:
+    """
+    메인 실행 함수
+
+    Returns:
+        종료 코드 (0: 성공, 1: 오류)
+    """
+    args = parse_arguments()
+
+    if args["debug"]:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    try:
+        panels = load_panels(args["panels"])
+        refreshed = display_gallery(panels, args["images"], dither=args["dither"], palette=args["palette"],
+                                    color_match=args["color_match"], resize_only=args["resize_only"],
+                                    centre_crop=args["centre_crop"], force=args["force"],
+                                    state_file=args["state_file"], metrics_log=args["metrics_log"])
+    except (OSError, ValueError, RuntimeError, ImportError) as e:
+        logger.error(f"Gallery display failed: {e}")
+        return 1
+
+    logger.info("Gallery updated: " + ", ".join(f"{name} {'refreshed' if done else 'unchanged'}"
+                                                for name, done in refreshed.items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,14 +6,27 @@ E-Ink Image Processor
 """
 
 import argparse
+import contextlib
+import hashlib
+import json
 import os
 import logging
 import sys
-from typing import Tuple, Optional, Dict, Any, Union
+import threading
+import time
+import queue
+from typing import Tuple, Optional, Dict, Any, Union, Iterator
 
 import cv2
 import numpy as np
-from PIL import Image
+
+from e_Paper import epdbuf
+from e_Paper import epdorient
+from e_Paper import epdpower
+from e_Paper import epdrle
+from e_Paper import epdtrace
+from e_Paper import epdpalette
+from e_Paper.epddither import DITHER_MODES, DEFAULT_DITHER, banded_mode
 
 # 상수 정의
 DEFAULT_WIDTH = 480
@@ -21,6 +34,13 @@ DEFAULT_HEIGHT = 800
 DEFAULT_SATURATION = 1.0
 CONVOLUTION_KERNEL_SIZE = 64
 DEFAULT_EPD_TYPE = "epd7in3f"  # 데모 Waveshare 디스플레이 타입
+DEFAULT_PALETTE = "ideal"
+DEFAULT_COLOR_MATCH = "rgb"
+DEFAULT_STATE_FILE = os.path.expanduser("~/.cache/jihwa/epd_state.json")  # 마지막으로 표시한 프레임 정보
+DEFAULT_METRICS_FILE = os.path.expanduser("~/.cache/jihwa/epd_metrics.jsonl")  # 갱신별 단계 시간/추정 에너지 기록
+DEFAULT_BAND_ROWS = 48  # 파이프라인 모드에서 한 번에 처리하는 패널 행 수
+PIPELINE_DEPTH = 4      # 렌더링과 전송 사이에 대기할 수 있는 최대 밴드 수
+LOW_MEMORY_BAND_ROWS = 16  # 저메모리 모드의 밴드당 패널 행 수 (대기 밴드는 1개)
 
 # 로깅 설정
 logging.basicConfig(
@@ -179,7 +199,525 @@ def crop(image: np.ndarray, disp_w: int, disp_h: int, intelligent: bool = True)
     return cropped_image
 
 
-def display_waveshare(image: np.ndarray, epd_type: str = DEFAULT_EPD_TYPE, saturation: float = DEFAULT_SATURATION) -> None:
+def file_digest(path: str) -> str:
+    """
+    파일 내용의 SHA-256 다이제스트를 계산합니다.
+    
+    Args:
+        path: 파일 경로
+        
+    Returns:
+        SHA-256 16진수 문자열
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def buffer_digest(buffer: Union[bytes, epdrle.PackBitsFrame]) -> str:
+    """
+    패킹된 패널 버퍼의 다이제스트를 계산합니다.
+    
+    Args:
+        buffer: getbuffer가 반환한 패널 버퍼 또는 압축된 버퍼 (압축을 푼 프레임 기준)
+        
+    Returns:
+        SHA-256 16진수 문자열
+    """
+    if isinstance(buffer, epdrle.PackBitsFrame):
+        return buffer.digest()
+    return hashlib.sha256(buffer).hexdigest()
+
+
+def render_digest(image: np.ndarray, epd_type: str, dither: str, lut: Any) -> str:
+    """
+    렌더링 전에 알 수 있는 입력(처리된 이미지와 렌더링 설정)의 다이제스트를 계산합니다.
+    같은 입력은 항상 같은 밴드 프레임이 되므로, 프레임을 만들기 전에 건너뛸지 판단할 수 있습니다.
+    
+    Args:
+        image: 표시할 이미지 배열 (OpenCV BGR)
+        epd_type: Waveshare 디스플레이 타입
+        dither: 요청한 디더링 방식 (밴드 렌더링에서 실제로 쓰는 엔진으로 바꿔서 기록)
+        lut: 양자화에 사용할 팔레트 테이블 (팔레트와 색 공간)
+        
+    Returns:
+        SHA-256 16진수 문자열
+    """
+    digest = hashlib.sha256(f"{epd_type}:{banded_mode(dither)}:{lut.key()}:{image.shape}".encode())
+    digest.update(np.ascontiguousarray(image))
+    return digest.hexdigest()
+
+
+def load_display_state(state_file: str) -> Dict[str, Any]:
+    """
+    디스플레이 상태 파일(디스플레이 타입별 마지막 프레임 다이제스트)을 읽습니다.
+    
+    Args:
+        state_file: 상태 파일 경로
+        
+    Returns:
+        상태 딕셔너리 (파일이 없거나 손상된 경우 빈 딕셔너리)
+    """
+    try:
+        with open(state_file, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable display state file {state_file}: {e}")
+        return {}
+
+
+def save_display_state(state_file: str, epd_type: str, digest: str, source: str = "") -> None:
+    """
+    마지막으로 표시한 프레임의 다이제스트를 상태 파일에 기록합니다.
+    
+    Args:
+        state_file: 상태 파일 경로
+        epd_type: Waveshare 디스플레이 타입
+        digest: 표시한 버퍼의 다이제스트
+        source: 프레임을 만든 입력의 다이제스트 (render_digest, 파이프라인 모드에서만 기록)
+    """
+    state = load_display_state(state_file)
+    state[epd_type] = {"digest": digest, "timestamp": time.time()}
+    if source:
+        state[epd_type]["source"] = source
+    
+    directory = os.path.dirname(state_file)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    
+    tmp_file = f"{state_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        json.dump(state, file)
+    os.replace(tmp_file, state_file)
+
+
+def process_image(image: np.ndarray, disp_w: int, disp_h: int, resize_only: bool = False,
+                  centre_crop: bool = False) -> np.ndarray:
+    """
+    이미지를 디스플레이 크기에 맞게 리사이즈 또는 크롭합니다.
+    
+    Args:
+        image: 처리할 이미지 배열
+        disp_w: 디스플레이 너비
+        disp_h: 디스플레이 높이
+        resize_only: 크롭 없이 단순 리사이즈만 수행
+        centre_crop: 지능적 크롭 대신 중앙 크롭 사용
+        
+    Returns:
+        디스플레이 크기의 이미지 배열
+    """
+    if resize_only:
+        logger.info(f"Simple resizing: {disp_w}x{disp_h}")
+        return cv2.resize(image, (disp_w, disp_h))
+    
+    # 중앙 크롭 또는 지능적 크롭
+    use_intelligent_crop = not centre_crop
+    crop_type = "Intelligent crop" if use_intelligent_crop else "Center crop"
+    logger.info(f"Using {crop_type}")
+    return crop(image, disp_w, disp_h, intelligent=use_intelligent_crop)
+
+
+def load_epd(epd_type: str = DEFAULT_EPD_TYPE) -> Any:
+    """
+    Waveshare EPD 드라이버 객체를 생성합니다.
+    보드 감지와 GPIO 점유는 첫 init()에서 일어나므로, 생성한 객체로 렌더링하고
+    같은 프레임이라 건너뛰는 경우에는 하드웨어를 건드리지 않습니다.
+    
+    Args:
+        epd_type: Waveshare 디스플레이 타입 (예: epd7in3f)
+        
+    Returns:
+        EPD 드라이버 객체
+        
+    Raises:
+        ImportError: 등록된 모델도, 드라이버 모듈도 없는 경우
+    """
+    # 패널 모델 레지스트리(e_Paper/epdmodels.py)에서 드라이버를 찾고, 없으면 e_Paper.<epd_type> 모듈을 가져옴 (한 번만 찾고 캐시)
+    from e_Paper import epdmodels
+    return epdmodels.get_driver(epd_type)()
+
+
+def panel_lut(epd: Any, palette: str = DEFAULT_PALETTE, color_match: str = DEFAULT_COLOR_MATCH,
+              dither: str = "") -> Any:
+    """
+    패널 팔레트의 양자화 테이블을 가져옵니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        palette: 팔레트 이름 또는 JSON 파일 경로 ("ideal"은 패널 모델의 기본 팔레트)
+        color_match: 최근접 색 매칭에 사용할 색 공간 (rgb 또는 lab)
+        dither: 테이블을 사용할 디더링 방식 (비어 있으면 테이블을 쓰는 엔진으로 간주)
+        
+    Returns:
+        epdpalette.PaletteLUT 객체
+    """
+    if dither == "pil" and color_match != "rgb":
+        # PIL의 양자화는 자체 RGB 거리로 색을 고르고 테이블을 쓰지 않으므로 Lab 테이블을 만들어도 결과가 같음
+        logger.warning(f"--color_match {color_match} has no effect with --dither pil; "
+                       f"use a LUT based engine (e.g. floyd-steinberg) for perceptual matching")
+        color_match = "rgb"
+    model = getattr(epd, "model", None)
+    colors = model.palette if model is not None and palette == DEFAULT_PALETTE else epdpalette.load_palette(palette)
+    return epdpalette.get_lut(colors, metric=color_match)
+
+
+@contextlib.contextmanager
+def trace_display(epd: Any, trace_file: str = "") -> Iterator[None]:
+    """
+    블록 안에서 EPD 드라이버와 GPIO/SPI 호출을 기록해 Chrome 트레이스 JSON으로 저장합니다.
+    trace_file이 비어 있으면 아무것도 감싸지 않으므로 오버헤드가 없습니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        trace_file: 트레이스를 저장할 JSON 파일 경로 (chrome://tracing 또는 ui.perfetto.dev에서 열기)
+    """
+    if not trace_file:
+        yield
+        return
+    
+    tracer = epdtrace.Tracer().attach(epd)
+    try:
+        yield
+    finally:
+        tracer.detach()
+        try:
+            tracer.save(trace_file)
+        except OSError as e:
+            logger.warning(f"Failed to save trace: {e}")
+
+
+def render_buffer(epd: Any, image: np.ndarray, dither: str = DEFAULT_DITHER, palette: str = DEFAULT_PALETTE,
+                  color_match: str = DEFAULT_COLOR_MATCH) -> bytes:
+    """
+    이미지를 패널에 바로 전송할 수 있는 패킹된 버퍼로 변환합니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        image: 표시할 이미지 배열 (OpenCV BGR)
+        dither: 패널 색상 양자화에 사용할 디더링 방식
+        palette: 패널 팔레트 이름(ideal, measured) 또는 측정 팔레트 JSON 파일 경로
+        color_match: 최근접 색상 비교 공간 (rgb 또는 lab)
+        
+    Returns:
+        패킹된 패널 버퍼
+    """
+    # OpenCV BGR을 복사 없이 RGB 뷰로 넘기고, 패널 방향 회전(또는 크기 맞춤)은 드라이버가 한 번만 적용
+    rgb = image[..., ::-1]
+    
+    logger.info(f"Creating image buffer (dither: {dither}, palette: {palette}, match: {color_match})...")
+    start = time.perf_counter()
+    lut = panel_lut(epd, palette, color_match, dither)
+    buffer = epd.getbuffer(rgb, dither=dither, lut=lut)
+    logger.info(f"Image buffer ready in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return buffer
+
+
+def log_refresh_metrics(epd: Any, epd_type: str, metrics_log: str = DEFAULT_METRICS_FILE) -> Optional[Dict[str, Any]]:
+    """
+    마지막 갱신의 단계별 시간과 전력 모델로 추정한 에너지를 기록합니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        epd_type: Waveshare 디스플레이 타입
+        metrics_log: 기록을 한 줄씩 추가할 JSON Lines 파일 경로 (빈 문자열이면 파일에 쓰지 않음)
+        
+    Returns:
+        갱신 기록 딕셔너리 (드라이버가 지원하지 않으면 None)
+    """
+    if not hasattr(epd, "refresh_record"):
+        return None
+    
+    record = epd.refresh_record()
+    record["epd_type"] = epd_type
+    logger.info(f"Refresh cycle: {record['total_seconds']:.1f} s, estimated {record['total_energy_mj']:.0f} mJ "
+                f"(" + ", ".join(f"{phase} {t:.2f} s" for phase, t in record["seconds"].items()) + ")")
+    if metrics_log:
+        try:
+            epdpower.append_record(metrics_log, record)
+        except OSError as e:
+            logger.warning(f"Failed to write refresh metrics: {e}")
+    return record
+
+
+def frame_already_displayed(digest: str, epd_type: str, state_file: str, key: str = "digest") -> bool:
+    """
+    화면에 이미 같은 프레임이 표시되어 있는지 확인합니다. 같으면 갱신(약 30초, 전력 소모)을 건너뛰도록 로그를 남깁니다.
+    
+    Args:
+        digest: 표시할 프레임의 다이제스트
+        epd_type: Waveshare 디스플레이 타입 (상태 파일의 키)
+        state_file: 마지막으로 표시한 프레임 다이제스트를 저장하는 파일
+        key: 비교할 상태 항목 ("digest"는 프레임, "source"는 render_digest로 만든 입력 다이제스트)
+        
+    Returns:
+        마지막으로 표시한 프레임과 같으면 True
+    """
+    if load_display_state(state_file).get(epd_type, {}).get(key) != digest:
+        return False
+    logger.info("Frame identical to the one already on the display: skipping refresh (use --force to override).")
+    return True
+
+
+def finish_refresh(epd: Any, epd_type: str, digest: str, state_file: str, metrics_log: str,
+                   source: str = "") -> None:
+    """
+    갱신이 끝난 패널을 재우고 갱신 기록과 표시 상태를 저장합니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        epd_type: Waveshare 디스플레이 타입 (상태 파일의 키)
+        digest: 표시한 프레임의 다이제스트
+        state_file: 마지막으로 표시한 프레임 다이제스트를 저장하는 파일
+        metrics_log: 갱신별 단계 시간/추정 에너지를 추가할 파일 (빈 문자열이면 기록 안 함)
+        source: 프레임을 만든 입력의 다이제스트 (선택, save_display_state 참고)
+    """
+    # 딥 슬립 안정화 대기(약 2초)는 백그라운드에서 끝내고 바로 반환 (다음 init이나 종료 시점에 마저 대기)
+    logger.info("Putting display to sleep mode.")
+    epd.sleep(wait=False)
+    log_refresh_metrics(epd, epd_type, metrics_log)
+    
+    try:
+        save_display_state(state_file, epd_type, digest, source)
+    except OSError as e:
+        logger.warning(f"Failed to save display state: {e}")
+    
+    logger.info("Image successfully displayed on e-Paper display.")
+
+
+def refresh_display(epd: Any, buffer: Union[bytes, epdrle.PackBitsFrame], epd_type: str = DEFAULT_EPD_TYPE,
+                    force: bool = False, state_file: str = DEFAULT_STATE_FILE,
+                    metrics_log: str = DEFAULT_METRICS_FILE) -> bool:
+    """
+    패킹된 버퍼를 패널에 표시합니다. 이미 같은 프레임이 표시되어 있으면 건너뜁니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        buffer: 패킹된 패널 버퍼 또는 압축된 버퍼 (SPI 청크 단위로 풀면서 전송)
+        epd_type: Waveshare 디스플레이 타입 (상태 파일의 키)
+        force: 화면에 이미 같은 프레임이 있어도 강제로 갱신
+        state_file: 마지막으로 표시한 프레임 다이제스트를 저장하는 파일
+        metrics_log: 갱신별 단계 시간/추정 에너지를 추가할 파일 (빈 문자열이면 기록 안 함)
+        
+    Returns:
+        실제로 패널을 갱신했으면 True, 동일한 프레임이라 건너뛰었으면 False
+    """
+    digest = buffer_digest(buffer)
+    if not force and frame_already_displayed(digest, epd_type, state_file):
+        return False
+    
+    # Initialize display and show image
+    logger.info("Initializing e-Paper display...")
+    epd.init()
+    
+    logger.info("Displaying image buffer...")
+    if isinstance(buffer, epdrle.PackBitsFrame):
+        # 전체 프레임을 메모리에 풀지 않고 SPI 청크 크기로 풀면서 바로 전송
+        profile = getattr(epd.hw, "spi_profile", None) or {}
+        epd.display_stream(buffer.chunks(profile.get("chunk_size", epdrle.CHUNK_SIZE)))
+    else:
+        epd.display(buffer)
+    
+    finish_refresh(epd, epd_type, digest, state_file, metrics_log)
+    return True
+
+
+def save_panel_buffer(path: str, buffer: bytes, epd: Any, epd_type: str, orientation: str, dither: str,
+                      source_hash: str = "", compress: bool = False) -> None:
+    """
+    패킹된 패널 버퍼를 미리 렌더링된 버퍼 파일(.epdbuf)로 저장합니다.
+    
+    Args:
+        path: 저장할 파일 경로
+        buffer: 패킹된 패널 버퍼
+        epd: EPD 드라이버 객체
+        epd_type: Waveshare 디스플레이 타입
+        orientation: 원본 이미지 방향 (landscape 또는 portrait)
+        dither: 버퍼 렌더링에 사용한 디더링 방식
+        source_hash: 원본 이미지 파일의 SHA-256
+        compress: 페이로드를 PackBits로 압축해서 저장 (크기가 5% 이상 줄지 않으면 압축하지 않고 저장)
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    
+    epdbuf.write(path, buffer, epd_type, epd.width, epd.height, bpp=getattr(epd, "bpp", 4), orientation=orientation,
+                 dither=dither, source_hash=source_hash, compress=compress)
+    stored = os.path.getsize(path) - epdbuf.HEADER.size
+    logger.info(f"Panel buffer saved: {path} ({stored} of {len(buffer)} bytes, ratio {len(buffer) / max(stored, 1):.1f}x)")
+
+
+def display_prerendered(path: str, epd_type: str = DEFAULT_EPD_TYPE, force: bool = False,
+                        state_file: str = DEFAULT_STATE_FILE, epd: Optional[Any] = None,
+                        trace: str = "", metrics_log: str = DEFAULT_METRICS_FILE) -> bool:
+    """
+    미리 렌더링된 버퍼 파일(.epdbuf)을 이미지 처리 없이 그대로 표시합니다.
+    
+    Args:
+        path: .epdbuf 파일 경로
+        epd_type: Waveshare 디스플레이 타입
+        force: 화면에 이미 같은 프레임이 있어도 강제로 갱신
+        state_file: 마지막으로 표시한 프레임 다이제스트를 저장하는 파일
+        epd: 재사용할 EPD 드라이버 객체 (없으면 epd_type으로 새로 생성)
+        trace: GPIO/SPI 트레이스를 저장할 JSON 파일 경로 (선택)
+        metrics_log: 갱신별 단계 시간/추정 에너지를 추가할 파일 (빈 문자열이면 기록 안 함)
+        
+    Returns:
+        실제로 패널을 갱신했으면 True, 동일한 프레임이라 건너뛰었으면 False
+        
+    Raises:
+        ValueError: 버퍼가 디스플레이 타입이나 크기와 맞지 않는 경우
+    """
+    # 파일을 메모리 매핑하여 페이로드를 복사 없이 SPI로 청크 단위 스트리밍 (패널 크기와 무관하게 메모리 사용 일정)
+    with epdbuf.mapped(path) as (info, buffer):
+        if info is None:
+            raise ValueError(f"{path} has no {epdbuf.EXTENSION} header")
+        compressed = f", PackBits {buffer.ratio():.1f}x" if isinstance(buffer, epdrle.PackBitsFrame) else ""
+        logger.info(f"Pre-rendered buffer: {info.model} {info.width}x{info.height}, {info.orientation}, "
+                    f"dither: {info.dither}{compressed}")
+        if info.model != epd_type:
+            raise ValueError(f"Buffer was rendered for {info.model}, not {epd_type}")
+        
+        if epd is None:
+            epd = load_epd(epd_type)
+        if (info.width, info.height) != (epd.width, epd.height):
+            raise ValueError(f"Buffer is {info.width}x{info.height}, display is {epd.width}x{epd.height}")
+        with trace_display(epd, trace):
+            return refresh_display(epd, buffer, epd_type=epd_type, force=force, state_file=state_file,
+                                   metrics_log=metrics_log)
+
+
+def iter_rgb_bands(image: np.ndarray, band_rows: int = DEFAULT_BAND_ROWS,
+                   panel_size: Tuple[int, int] = (DEFAULT_HEIGHT, DEFAULT_WIDTH)) -> Iterator[np.ndarray]:
+    """
+    이미지를 패널 스캔 순서의 RGB 행 밴드로 나누어 차례로 반환합니다.
+    
+    Args:
+        image: 표시할 이미지 배열 (OpenCV BGR)
+        band_rows: 밴드당 패널 행 수
+        panel_size: 패널 스캔 해상도 (너비, 높이)
+        
+    Yields:
+        (band_rows, 패널 너비, 3) 형태의 RGB 배열
+    """
+    # BGR->RGB와 회전은 뷰로만 적용하고, 밴드마다 해당 부분만 연속 배열로 복사 (전체 회전 사본 없음)
+    rgb = epdorient.orient(image[..., ::-1], *panel_size)
+    for y in range(0, rgb.shape[0], band_rows):
+        yield np.ascontiguousarray(rgb[y:y + band_rows])
+
+
+def refresh_display_pipelined(epd: Any, image: np.ndarray, epd_type: str = DEFAULT_EPD_TYPE,
+                              dither: str = DEFAULT_DITHER, palette: str = DEFAULT_PALETTE,
+                              color_match: str = DEFAULT_COLOR_MATCH, force: bool = False,
+                              state_file: str = DEFAULT_STATE_FILE,
+                              band_rows: int = DEFAULT_BAND_ROWS, depth: int = PIPELINE_DEPTH,
+                              metrics_log: str = DEFAULT_METRICS_FILE) -> bool:
+    """
+    양자화/패킹과 SPI 전송을 겹쳐서 이미지를 표시합니다.
+    
+    렌더링 스레드가 행 밴드 단위로 양자화와 패킹을 하는 동안 패널을 초기화하고, 완료된 밴드를 바로 전송합니다.
+    렌더링 전에 입력 다이제스트(render_digest)가 마지막 갱신과 같으면 패널을 깨우지 않고 끝냅니다.
+    입력은 다르지만 전송한 프레임이 화면과 같으면 TurnOnDisplay(약 30초)만 건너뛰고 패널을 재웁니다.
+    
+    Args:
+        epd: EPD 드라이버 객체
+        image: 표시할 이미지 배열 (OpenCV BGR)
+        epd_type: Waveshare 디스플레이 타입
+        dither: 패널 색상 양자화에 사용할 디더링 방식
+        palette: 패널 팔레트 이름(ideal, measured) 또는 측정 팔레트 JSON 파일 경로
+        color_match: 최근접 색상 비교 공간 (rgb 또는 lab)
+        force: 화면에 이미 같은 프레임이 있어도 강제로 갱신
+        state_file: 마지막으로 표시한 프레임 다이제스트를 저장하는 파일
+        band_rows: 밴드당 패널 행 수
+        depth: 렌더링과 전송 사이에 대기할 수 있는 최대 밴드 수 (메모리 상한)
+        metrics_log: 갱신별 단계 시간/추정 에너지를 추가할 파일 (빈 문자열이면 기록 안 함)
+        
+    Returns:
+        실제로 패널을 갱신했으면 True, 동일한 프레임이라 건너뛰었으면 False
+    """
+    lut = panel_lut(epd, palette, color_match)
+    source = render_digest(image, epd_type, dither, lut)
+    if not force and frame_already_displayed(source, epd_type, state_file, key="source"):
+        return False
+    
+    bands = epd.getbuffer_bands(iter_rgb_bands(image, band_rows, (epd.width, epd.height)), dither=dither, lut=lut)
+    pending: "queue.Queue[Any]" = queue.Queue(maxsize=depth)
+    stats = {"render": 0.0, "wait": 0.0}
+    
+    def produce() -> None:
+        try:
+            while True:
+                start = time.perf_counter()
+                band = next(bands, None)
+                stats["render"] += time.perf_counter() - start
+                pending.put(band)
+                if band is None:
+                    return
+        except Exception as e:
+            pending.put(e)
+    
+    def consume(digest: Any) -> Iterator[bytes]:
+        while True:
+            start = time.perf_counter()
+            band = pending.get()
+            stats["wait"] += time.perf_counter() - start
+            if band is None:
+                return
+            if isinstance(band, Exception):
+                raise band
+            digest.update(band)
+            yield band
+    
+    logger.info(f"Pipelined display (dither: {dither}, band rows: {band_rows})...")
+    wall_start = time.perf_counter()
+    producer = threading.Thread(target=produce, name="epd-render", daemon=True)
+    producer.start()
+    digest = hashlib.sha256()
+    
+    # 첫 밴드들이 렌더링되는 동안 패널 초기화
+    logger.info("Initializing e-Paper display...")
+    start = time.perf_counter()
+    epd.init()
+    init_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    wait_before = stats["wait"]
+    epd.send_frame_stream(consume(digest))
+    stream_time = time.perf_counter() - start
+    producer.join()
+    
+    wall = time.perf_counter() - wall_start
+    transfer = stream_time - (stats["wait"] - wait_before)
+    overlap = stats["render"] + init_time + transfer - wall
+    logger.info(f"Pipeline: render {stats['render']:.3f} s, init {init_time:.3f} s, transfer {transfer:.3f} s, "
+                f"wall {wall:.3f} s, overlap {max(overlap, 0.0):.3f} s")
+    
+    if not force and frame_already_displayed(digest.hexdigest(), epd_type, state_file):
+        # 다른 입력이 화면과 같은 프레임이 된 경우: 패널 RAM만 다시 썼으므로 갱신 없이 재움
+        epd.sleep(wait=False)
+        try:
+            save_display_state(state_file, epd_type, digest.hexdigest(), source)
+        except OSError as e:
+            logger.warning(f"Failed to save display state: {e}")
+        return False
+    
+    epd.TurnOnDisplay()
+    finish_refresh(epd, epd_type, digest.hexdigest(), state_file, metrics_log, source)
+    return True
+
+
+def display_waveshare(image: np.ndarray, epd_type: str = DEFAULT_EPD_TYPE, saturation: float = DEFAULT_SATURATION,
+                      dither: str = DEFAULT_DITHER, palette: str = DEFAULT_PALETTE,
+                      color_match: str = DEFAULT_COLOR_MATCH, force: bool = False,
+                      state_file: str = DEFAULT_STATE_FILE, epd: Optional[Any] = None,
+                      emit_buffer: str = "", source_hash: str = "", compress_buffer: bool = False,
+                      simulate: bool = False,
+                      pipeline: bool = False, band_rows: int = DEFAULT_BAND_ROWS,
+                      low_memory: bool = False, trace: str = "",
+                      metrics_log: str = DEFAULT_METRICS_FILE) -> bool:
     """
     이미지를 Waveshare e-ink 디스플레이에 표시합니다.
     
@@ -187,36 +725,53 @@ def display_waveshare(image: np.ndarray, epd_type: str = DEFAULT_EPD_TYPE, satur
         image: 표시할 이미지 배열
         epd_type: Waveshare 디스플레이 타입 (예: epd7in3f)
         saturation: 색상 채도 (0.0 - 1.0)
+        dither: 패널 색상 양자화에 사용할 디더링 방식
+        palette: 패널 팔레트 이름(ideal, measured) 또는 측정 팔레트 JSON 파일 경로
+        color_match: 최근접 색상 비교 공간 (rgb 또는 lab)
+        force: 화면에 이미 같은 프레임이 있어도 강제로 갱신
+        state_file: 마지막으로 표시한 프레임 다이제스트를 저장하는 파일
+        epd: 재사용할 EPD 드라이버 객체 (없으면 epd_type으로 새로 생성)
+        emit_buffer: 패킹된 패널 버퍼를 저장할 .epdbuf 파일 경로 (선택)
+        source_hash: 원본 이미지 파일의 SHA-256 (.epdbuf 헤더에 기록)
+        compress_buffer: 저장하는 .epdbuf 페이로드를 PackBits로 압축
+        simulate: 버퍼만 만들고 패널은 갱신하지 않음
+        pipeline: 밴드 단위 양자화/패킹과 SPI 전송을 겹쳐서 처리 (버퍼 저장/시뮬레이션 시 무시)
+        band_rows: 파이프라인 모드의 밴드당 패널 행 수
+        low_memory: 작은 밴드 하나씩만 메모리에 두는 밴드 스트리밍 모드 (전체 프레임 사본을 만들지 않음)
+        trace: GPIO/SPI 호출과 갱신 단계를 기록한 Chrome 트레이스 JSON 파일 경로 (선택)
+        metrics_log: 갱신별 단계 시간/추정 에너지를 추가할 JSON Lines 파일 (빈 문자열이면 기록 안 함)
+        
+    Returns:
+        실제로 패널을 갱신했으면 True, 동일한 프레임이라 건너뛰었으면 False
         
     Raises:
         ImportError: 필요한 모듈을 가져올 수 없는 경우
         RuntimeError: 디스플레이 초기화/표시 오류가 발생한 경우
     """
     try:
-        # 동적으로 특정 EPD 모듈 가져오기
-        epd_module = __import__(f"e_Paper.{epd_type}", fromlist=['']) #원래는 폴더명이 waveshare_epd를 사용해서 (f"waveshare_epd.{epd_type}", fromlist=['']) 이지만, 폴더명을 e-Paper로 지정하였기에 e-Paper로 코드 변경
-        epd = epd_module.EPD()
-        
-        # 이미지 방향 조정 (세로 이미지 처리)
-        if image.shape[0] > image.shape[1]:
-            logger.debug("Portrait image detected: rotating image.")
-            image = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        
-        # OpenCV BGR에서 PIL RGB로 변환
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        pil_image = Image.fromarray(image)
-        
-        # Initialize display and show image
-        logger.info("Initializing e-Paper display...")
-        epd.init()
-        
-        logger.info("Creating and displaying image buffer...")
-        epd.display(epd.getbuffer(pil_image))
+        if epd is None:
+            # 렌더링에 필요한 해상도/팔레트만 쓰고, 패널은 "이미 표시됨" 확인 뒤의 init()에서 처음 사용
+            epd = load_epd(epd_type)
         
-        logger.info("Putting display to sleep mode.")
-        epd.sleep()
+        if (pipeline or low_memory) and not emit_buffer and not simulate:
+            depth = PIPELINE_DEPTH
+            if low_memory:
+                band_rows, depth = min(band_rows, LOW_MEMORY_BAND_ROWS), 1
+            with trace_display(epd, trace):
+                return refresh_display_pipelined(epd, image, epd_type=epd_type, dither=dither, palette=palette,
+                                                 color_match=color_match, force=force, state_file=state_file,
+                                                 band_rows=band_rows, depth=depth, metrics_log=metrics_log)
         
-        logger.info("Image successfully displayed on e-Paper display.")
+        orientation = "portrait" if image.shape[0] > image.shape[1] else "landscape"
+        buffer = render_buffer(epd, image, dither=dither, palette=palette, color_match=color_match)
+        if emit_buffer:
+            save_panel_buffer(emit_buffer, buffer, epd, epd_type, orientation, dither, source_hash,
+                              compress=compress_buffer)
+        if simulate:
+            return False
+        with trace_display(epd, trace):
+            return refresh_display(epd, buffer, epd_type=epd_type, force=force, state_file=state_file,
+                                   metrics_log=metrics_log)
     except ImportError as e:
         logger.error(f"Could not import Waveshare EPD module: {e}")
         logger.error("Make sure required packages are installed.")
@@ -241,7 +796,7 @@ def parse_arguments() -> Dict[str, Any]:
     
     parser.add_argument(
         "image", 
-        help="Input image file path to process"
+        help=f"Input image file path to process, or a pre-rendered {epdbuf.EXTENSION} panel buffer"
     )
     parser.add_argument(
         "-o", "--output", 
@@ -289,6 +844,76 @@ def parse_arguments() -> Dict[str, Any]:
         default=DEFAULT_EPD_TYPE,
         help="Waveshare EPD module type to use (e.g., epd7in3f)"
     )
+    parser.add_argument(
+        "--dither", 
+        choices=DITHER_MODES,
+        default=DEFAULT_DITHER,
+        help="Dithering engine used to map colours to the panel palette"
+    )
+    parser.add_argument(
+        "--palette", 
+        default=DEFAULT_PALETTE,
+        help="Panel palette: 'ideal', 'measured' or a JSON file of measured [r, g, b] colours"
+    )
+    parser.add_argument(
+        "--color_match", 
+        choices=epdpalette.COLOR_METRICS,
+        default=DEFAULT_COLOR_MATCH,
+        help="Colour space used for nearest-colour matching (lab is perceptual)"
+    )
+    parser.add_argument(
+        "-f", "--force", 
+        action="store_true",
+        default=False, 
+        help="Refresh the display even if the same frame is already shown"
+    )
+    parser.add_argument(
+        "--state_file", 
+        default=DEFAULT_STATE_FILE,
+        help="File storing the digest of the last displayed frame"
+    )
+    parser.add_argument(
+        "--emit_buffer", "--emit-buffer", 
+        default="",
+        help=f"Also write the packed panel buffer to this {epdbuf.EXTENSION} file for later display"
+    )
+    parser.add_argument(
+        "--compress_buffer", 
+        action="store_true",
+        default=False, 
+        help="Store the --emit_buffer payload run-length (PackBits) compressed; it is decompressed while streaming. "
+             "Pays off with --dither none/bayer or flat artwork; dithered photos are stored uncompressed"
+    )
+    parser.add_argument(
+        "--pipeline", 
+        action="store_true",
+        default=False, 
+        help="Overlap band-wise quantization/packing with the SPI frame transfer "
+             "(--dither pil is replaced by blue-noise, which stays seamless across bands)"
+    )
+    parser.add_argument(
+        "--low_memory", 
+        action="store_true",
+        default=False, 
+        help="Stream small row bands through conversion, quantization and packing with bounded buffers "
+             "(--dither pil is replaced by blue-noise, which stays seamless across bands)"
+    )
+    parser.add_argument(
+        "--band_rows", 
+        type=int,
+        default=DEFAULT_BAND_ROWS,
+        help="Panel rows per band in pipeline mode"
+    )
+    parser.add_argument(
+        "--metrics_log", 
+        default=DEFAULT_METRICS_FILE,
+        help="JSON Lines file receiving per-refresh phase timings and estimated energy ('' to disable)"
+    )
+    parser.add_argument(
+        "--trace", 
+        default="",
+        help="Write a Chrome/Perfetto trace of the GPIO/SPI calls and refresh phases to this JSON file"
+    )
     parser.add_argument(
         "--debug", 
         action="store_true",
@@ -315,6 +940,20 @@ def main() -> int:
         logger.debug("Debug mode activated.")
     
     try:
+        # 미리 렌더링된 패널 버퍼는 이미지 처리 없이 바로 표시
+        if args["image"].endswith(epdbuf.EXTENSION):
+            if args["simulate_display"]:
+                logger.info("Simulation mode: skipping display output.")
+                return 0
+            try:
+                display_prerendered(args["image"], epd_type=args["epd"], force=args["force"],
+                                    state_file=args["state_file"], trace=args["trace"],
+                                    metrics_log=args["metrics_log"])
+                return 0
+            except (ImportError, RuntimeError, OSError, ValueError) as e:
+                logger.error(f"Display error: {e}")
+                return 1
+        
         # 디스플레이 크기 설정
         disp_w, disp_h = int(args["width"]), int(args["height"])
         
@@ -330,27 +969,29 @@ def main() -> int:
             logger.error(f"Failed to load image: {e}")
             return 1
         
-        # 이미지 처리
-        if args["resize_only"]:
-            logger.info(f"Simple resizing: {disp_w}x{disp_h}")
-            processed_image = cv2.resize(image, (disp_w, disp_h))
-        else:
-            # 중앙 크롭 또는 지능적 크롭
-            use_intelligent_crop = not args["centre_crop"]
-            crop_type = "Intelligent crop" if use_intelligent_crop else "Center crop"
-            logger.info(f"Using {crop_type}")
-            processed_image = crop(image, disp_w, disp_h, intelligent=use_intelligent_crop)
-        
-        # 결과 이미지 표시
-        if not args["simulate_display"]:
+        # 이미지 처리 (원본은 더 이상 필요 없으므로 바로 해제)
+        processed_image = process_image(image, disp_w, disp_h, resize_only=args["resize_only"],
+                                        centre_crop=args["centre_crop"])
+        del image
+        
+        # 결과 이미지 표시 (시뮬레이션 모드에서도 --emit_buffer가 있으면 버퍼는 생성)
+        if args["simulate_display"]:
+            logger.info("Simulation mode: skipping display output.")
+        if not args["simulate_display"] or args["emit_buffer"]:
             try:
                 logger.info(f"Displaying image using {args['epd']} display module...")
-                display_waveshare(processed_image, epd_type=args["epd"])
+                source_hash = file_digest(args["image"]) if args["emit_buffer"] else ""
+                display_waveshare(processed_image, epd_type=args["epd"], dither=args["dither"],
+                                  palette=args["palette"], color_match=args["color_match"],
+                                  force=args["force"], state_file=args["state_file"],
+                                  emit_buffer=args["emit_buffer"], source_hash=source_hash,
+                                  compress_buffer=args["compress_buffer"],
+                                  simulate=args["simulate_display"], pipeline=args["pipeline"],
+                                  band_rows=args["band_rows"], low_memory=args["low_memory"],
+                                  trace=args["trace"], metrics_log=args["metrics_log"])
             except (ImportError, RuntimeError) as e:
                 logger.error(f"Display error: {e}")
                 # Continue to save image even if display fails
-        else:
-            logger.info("Simulation mode: skipping display output.")
         
         # 이미지 저장
         if args["output"]:
@@ -0,0 +1,363 @@
+import asyncio
+import atexit
+import contextlib
+import functools
+import logging
+import os
+import threading
+from . import epdconfig
+from . import epdpack
+from . import epddither
+from . import epdorient
+from . import epdpalette
+from . import epdpower
+
+import time
+import numpy as np
+from PIL import Image
+
+# Longest time a single BUSY phase may take before giving up (seconds, None waits forever)
+BUSY_TIMEOUT    = 90
+# BUSY sampling interval of the async API (seconds); a refresh takes ~30 s
+BUSY_POLL_INTERVAL = 0.05
+# Time the controller needs after DEEP_SLEEP before the module may be powered
+# down (ms); EPD_SLEEP_SETTLE_MS overrides it
+SLEEP_SETTLE_MS = int(os.environ.get("EPD_SLEEP_SETTLE_MS", 2000))
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.asynccontextmanager
+async def _holding(lock):
+    # Hold an optional asyncio.Lock (e.g. a PanelScheduler bus lock)
+    if lock is None:
+        yield
+        return
+    async with lock:
+        yield
+
+
+# Generic driver for the Waveshare SPI panels, driven by an epdmodels.EPDModel
+# descriptor: resolution, palette, bits per pixel, init table and refresh commands
+class EPD:
+    def __init__(self, model, backend=None):
+        # backend: epdconfig.get_backend(pins, spi) for a panel off the default wiring
+        self.hw = backend if backend is not None else epdconfig
+        self.model = model
+        self.width = model.width
+        self.height = model.height
+        self.bpp = model.bpp
+        self.frame_bytes = model.width * model.height * model.bpp // 8
+        self.busy_timeout = BUSY_TIMEOUT
+        self.busy_times = {}     # measured BUSY duration (s) per phase
+        self.phase_times = {}    # wall time (s) per epdpower.PHASES entry of the current cycle
+        self.power_model = epdpower.load_power_model(model.name)
+        self.last_transfer = None
+        self.sleep_settle_ms = SLEEP_SETTLE_MS
+        self._sleep_deadline = None     # set while a background deep sleep is settling
+        self._sleep_lock = threading.Lock()
+        self._exit_hook = False         # finish_sleep registered with atexit
+        
+    # Pins are read from the backend on first use, so creating an EPD (e.g. to
+    # render a frame that turns out to be on screen already) neither detects
+    # the board nor claims any GPIO; the first init() does
+    @functools.cached_property
+    def reset_pin(self):
+        return self.hw.RST_PIN
+
+    @functools.cached_property
+    def dc_pin(self):
+        return self.hw.DC_PIN
+
+    @functools.cached_property
+    def busy_pin(self):
+        return self.hw.BUSY_PIN
+
+    @functools.cached_property
+    def cs_pin(self):
+        return self.hw.CS_PIN
+
+    # Hardware reset
+    def reset(self):
+        self.hw.digital_write(self.reset_pin, 1)
+        self.hw.delay_ms(20) 
+        self.hw.digital_write(self.reset_pin, 0)         # module reset
+        self.hw.delay_ms(2)
+        self.hw.digital_write(self.reset_pin, 1)
+        self.hw.delay_ms(20)   
+
+    def send_command(self, command):
+        self.hw.digital_write(self.dc_pin, 0)
+        self.hw.digital_write(self.cs_pin, 0)
+        self.hw.spi_writebyte([command])
+        self.hw.digital_write(self.cs_pin, 1)
+
+    def send_data(self, data):
+        self.hw.digital_write(self.dc_pin, 1)
+        self.hw.digital_write(self.cs_pin, 0)
+        self.hw.spi_writebyte([data])
+        self.hw.digital_write(self.cs_pin, 1)
+        
+    # send a command and its parameters as one transaction: DC is set once per
+    # phase and the whole parameter block goes out in a single SPI transfer
+    def send_command_with_data(self, command, data):
+        self.hw.digital_write(self.dc_pin, 0)
+        self.hw.digital_write(self.cs_pin, 0)
+        self.hw.spi_writebyte([command])
+        if data:
+            self.hw.digital_write(self.dc_pin, 1)
+            self.hw.spi_writebyte2(bytes(data))
+        self.hw.digital_write(self.cs_pin, 1)
+
+    # send a lot of data   
+    def send_data2(self, data):
+        self.hw.digital_write(self.dc_pin, 1)
+        self.hw.digital_write(self.cs_pin, 0)
+        self.hw.spi_writebyte2(data)
+        self.hw.digital_write(self.cs_pin, 1)
+        
+    def ReadBusyH(self, phase="busy"):
+        logger.debug("e-Paper busy H")
+        start = time.monotonic()
+        # Sleeps on the BUSY edge instead of polling until BUSY reads the idle level
+        if not self.hw.digital_wait(self.busy_pin, self.model.busy_idle, self.busy_timeout):
+            raise TimeoutError("e-Paper still busy after %s s (%s)" % (self.busy_timeout, phase))
+        self.busy_times[phase] = time.monotonic() - start
+        logger.debug("e-Paper busy H release (%s: %.3f s)" % (phase, self.busy_times[phase]))
+
+    def log_busy_times(self):
+        logger.info("Busy time: " + ", ".join("%s %.2f s" % (phase, self.busy_times[phase])
+                                              for _, _, phase in self.model.refresh_sequence))
+
+    def TurnOnDisplay(self):
+        for command, data, phase in self.model.refresh_sequence:
+            start = time.monotonic()
+            self.send_command_with_data(command, data)
+            self.ReadBusyH(phase)
+            self.phase_times[phase] = time.monotonic() - start
+        self.log_busy_times()
+        
+    def init(self):
+        self.finish_sleep()
+        if (self.hw.module_init() != 0):
+            return -1
+        self.phase_times = {}
+        # EPD hardware init start
+        start = time.monotonic()
+        self.reset()
+        self.ReadBusyH("reset")
+        self.phase_times["reset"] = time.monotonic() - start
+
+        start = time.monotonic()
+        self.hw.delay_ms(self.model.init_delay_ms)
+        for command, data in self.model.init_sequence:
+            self.send_command_with_data(command, data)
+        self.phase_times["init"] = time.monotonic() - start
+        return 0
+
+    # Timing and estimated energy of the last init/display/sleep cycle, as a
+    # dict ready to be logged (see epdpower.refresh_record)
+    def refresh_record(self):
+        return epdpower.refresh_record(self.model.name, self.phase_times, self.power_model,
+                                       self.busy_times, self.last_transfer)
+
+    # Palette lookup table of the panel unless the caller brings its own
+    def lut(self, lut=None):
+        return lut if lut is not None else epdpalette.get_lut(self.model.palette)
+
+    # image is a PIL image or an (h, w, 3) RGB array; it is brought into panel
+    # scan order by the one transform epdorient plans for its size (none, a
+    # rotation view, or fitting an unexpected size into the panel)
+    def getbuffer(self, image, dither=epddither.DEFAULT_DITHER, lut=None):
+        if isinstance(image, Image.Image):
+            image = np.asarray(image.convert("RGB"))
+        rgb = epdorient.orient(image, self.width, self.height)
+
+        # Convert the source image to the panel colors with the selected dither engine
+        indices = epddither.dither(rgb, dither, self.lut(lut))
+
+        # PIL does not support 4 bit color, so pack bpp bits per pixel
+        # to transfer to the panel
+        return epdpack.pack(indices, self.bpp)
+
+    # Same as getbuffer for a frame given as consecutive RGB row bands in panel
+    # scan order (numpy arrays of shape (rows, width, 3)); yields one packed
+    # bytes object per band, with dither error carried across band edges
+    def getbuffer_bands(self, bands, dither=epddither.DEFAULT_DITHER, lut=None):
+        banded = epddither.banded_mode(dither)
+        if banded != dither:
+            logger.info("Dither '%s' cannot carry error across bands: the banded frame uses '%s'" % (dither, banded))
+            dither = banded
+        ditherer = epddither.Ditherer(dither, self.lut(lut))
+        for band in bands:
+            yield epdpack.pack(ditherer(band), self.bpp)
+
+    def report_transfer(self, nbytes, elapsed):
+        # Frame transfer throughput, to tune the SPI clock against the wiring
+        profile = getattr(self.hw, "spi_profile", None)
+        clock = " @ %.1f MHz" % (profile["max_speed_hz"] / 1e6) if profile else ""
+        self.last_transfer = {"bytes": nbytes, "seconds": elapsed,
+                              "bytes_per_s": nbytes / elapsed if elapsed > 0 else float("inf")}
+        self.phase_times["transfer"] = elapsed
+        logger.info("Frame transfer: %d bytes in %.3f s (%.1f KB/s%s)"
+                    % (nbytes, elapsed, self.last_transfer["bytes_per_s"] / 1024, clock))
+
+    # Write a packed frame to the panel RAM without refreshing
+    def send_frame(self, image):
+        start = time.monotonic()
+        self.send_command(self.model.frame_command)
+        self.send_data2(image)
+        self.report_transfer(len(image), time.monotonic() - start)
+
+    def display(self, image):
+        self.send_frame(image)
+        self.TurnOnDisplay()
+        
+    # Write a frame to the panel RAM from an iterable of packed chunks without
+    # refreshing, so chunks can be transmitted while later ones are still being
+    # rendered. Only time spent on the bus counts towards the reported throughput.
+    def send_frame_stream(self, chunks):
+        nbytes = 0
+        elapsed = 0.0
+        self.send_command(self.model.frame_command)
+        self.hw.digital_write(self.dc_pin, 1)
+        self.hw.digital_write(self.cs_pin, 0)
+        for chunk in chunks:
+            start = time.monotonic()
+            self.hw.spi_writebyte2(chunk)
+            elapsed += time.monotonic() - start
+            nbytes += len(chunk)
+        self.hw.digital_write(self.cs_pin, 1)
+        self.report_transfer(nbytes, elapsed)
+
+    def display_stream(self, chunks):
+        self.send_frame_stream(chunks)
+        self.TurnOnDisplay()
+
+    # color is a packed byte, white by default
+    def solid_frame(self, color=None):
+        if color is None:
+            color = epdpack.fill_byte(self.model.white, self.bpp)
+        return epdpack.solid_frame(color, self.frame_bytes)
+
+    # The cached solid frame goes through send_frame() like any other frame,
+    # so the transfer is timed and shows up in refresh_record()
+    def Clear(self, color=None):
+        self.display(self.solid_frame(color))
+
+    # Anti-ghosting / maintenance pattern, e.g. display_pattern("stripes", (0, 1), 8)
+    def display_pattern(self, kind, colors, size=1):
+        self.display(epdpack.pattern_frame(kind, tuple(colors), self.width, self.height, size, self.bpp))
+
+    # With wait=False the settle delay and module_exit() run on a timer and the
+    # caller gets control back at once; init() and interpreter exit wait out
+    # whatever is left of the delay, so the module is never cut off early.
+    # A one-shot script therefore still spends the delay, at exit.
+    def sleep(self, wait=True):
+        self.send_sleep_sequence()
+        if wait:
+            self.hw.delay_ms(self.sleep_settle_ms)
+            self.hw.module_exit()
+            return
+        self.settle_in_background()
+
+    def send_sleep_sequence(self):
+        for command, data in self.model.sleep_sequence:
+            self.send_command_with_data(command, data)
+        # The controller takes the settle delay to power down whether or not we wait for it
+        self.phase_times["sleep"] = self.sleep_settle_ms / 1000.0
+
+    def settle_in_background(self):
+        with self._sleep_lock:
+            self._sleep_deadline = time.monotonic() + self.sleep_settle_ms / 1000.0
+        timer = threading.Timer(self.sleep_settle_ms / 1000.0, self.finish_sleep)
+        timer.daemon = True
+        timer.start()
+        if not self._exit_hook:
+            # Once per EPD; the hook looks finish_sleep up when it runs, so it
+            # also goes through a tracer attached in the meantime
+            atexit.register(self._finish_sleep_at_exit)
+            self._exit_hook = True
+        logger.debug("Deep sleep settling in the background (%d ms)" % self.sleep_settle_ms)
+
+    def _finish_sleep_at_exit(self):
+        self.finish_sleep()
+
+    # Complete a pending background deep sleep; no-op if there is none
+    def finish_sleep(self):
+        with self._sleep_lock:
+            if self._sleep_deadline is None:
+                return
+            remaining = self._sleep_deadline - time.monotonic()
+            if remaining > 0:
+                logger.debug("Waiting %.3f s for deep sleep to settle" % remaining)
+                time.sleep(remaining)
+            self._sleep_deadline = None
+            self.hw.module_exit()
+
+    # asyncio variants: BUSY waits and delays yield to the event loop instead of
+    # blocking the calling thread, and the frame transfer runs in the loop's
+    # default executor. Calls on one EPD must still be awaited one at a time.
+    async def ReadBusyH_async(self, phase="busy"):
+        logger.debug("e-Paper busy H")
+        start = time.monotonic()
+        while self.hw.digital_read(self.busy_pin) != self.model.busy_idle:
+            if self.busy_timeout is not None and time.monotonic() - start > self.busy_timeout:
+                raise TimeoutError("e-Paper still busy after %s s (%s)" % (self.busy_timeout, phase))
+            await asyncio.sleep(BUSY_POLL_INTERVAL)
+        self.busy_times[phase] = time.monotonic() - start
+        logger.debug("e-Paper busy H release (%s: %.3f s)" % (phase, self.busy_times[phase]))
+
+    async def reset_async(self):
+        self.hw.digital_write(self.reset_pin, 1)
+        await asyncio.sleep(0.02)
+        self.hw.digital_write(self.reset_pin, 0)         # module reset
+        await asyncio.sleep(0.002)
+        self.hw.digital_write(self.reset_pin, 1)
+        await asyncio.sleep(0.02)
+
+    async def init_async(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.finish_sleep)
+        if (self.hw.module_init() != 0):
+            return -1
+        self.phase_times = {}
+        start = time.monotonic()
+        await self.reset_async()
+        await self.ReadBusyH_async("reset")
+        self.phase_times["reset"] = time.monotonic() - start
+
+        start = time.monotonic()
+        await asyncio.sleep(self.model.init_delay_ms / 1000.0)
+        for command, data in self.model.init_sequence:
+            self.send_command_with_data(command, data)
+        self.phase_times["init"] = time.monotonic() - start
+        return 0
+
+    # bus_lock, if given, is held for each command write but not for the BUSY
+    # waits, so panels sharing an SPI bus keep refreshing concurrently
+    async def TurnOnDisplay_async(self, bus_lock=None):
+        for command, data, phase in self.model.refresh_sequence:
+            start = time.monotonic()
+            async with _holding(bus_lock):
+                self.send_command_with_data(command, data)
+            await self.ReadBusyH_async(phase)
+            self.phase_times[phase] = time.monotonic() - start
+        self.log_busy_times()
+
+    async def display_async(self, image):
+        await asyncio.get_running_loop().run_in_executor(None, self.send_frame, image)
+        await self.TurnOnDisplay_async()
+
+    async def Clear_async(self, color=None):
+        await self.display_async(self.solid_frame(color))
+
+    async def sleep_async(self, wait=True, bus_lock=None):
+        async with _holding(bus_lock):
+            self.send_sleep_sequence()
+        if not wait:
+            self.settle_in_background()
+            return
+        await asyncio.sleep(self.sleep_settle_ms / 1000.0)
+        self.hw.module_exit()
+### END OF FILE ###
+
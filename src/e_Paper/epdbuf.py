@@ -0,0 +1,139 @@
+import collections
+import contextlib
+import logging
+import mmap
+import struct
+from . import epdrle
+
+logger = logging.getLogger(__name__)
+
+# Pre-rendered panel buffer file (.epdbuf): a fixed 80 byte little-endian header
+# followed by the packed frame exactly as it is streamed to the panel, or by
+# its PackBits encoding when FLAG_PACKBITS is set (see epdrle).
+#
+#   magic       4s   b"EPDB"
+#   version     B
+#   flags       B    FLAG_PACKBITS or 0
+#   width       H    panel scan width in pixels
+#   height      H    panel scan height in pixels
+#   bpp         B    bits per pixel of the payload
+#   orientation B    0: landscape source, 1: portrait source rotated to the panel
+#   model       16s  driver module name, e.g. b"epd7in3f"
+#   dither      16s  dither mode used to render the frame
+#   source_hash 32s  SHA-256 of the source image file
+#   length      I    decoded payload length in bytes (the stored payload runs to
+#                    the end of the file)
+EXTENSION = ".epdbuf"
+MAGIC = b"EPDB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHHBB16s16s32sI")
+# A compressed payload must come out at most this fraction of the frame, or
+# the frame is stored raw: dithered photos barely shrink and would only pay
+# for decoding on every display
+PACKBITS_MAX_RATIO = 0.95
+
+FLAG_PACKBITS = 0x01
+FLAGS = FLAG_PACKBITS
+
+ORIENTATIONS = ("landscape", "portrait")
+
+BufferInfo = collections.namedtuple(
+    "BufferInfo", "width height bpp orientation model dither source_hash length flags")
+
+
+def _text(value):
+    return value.rstrip(b"\0").decode("ascii")
+
+
+def pack_header(info):
+    return HEADER.pack(MAGIC, VERSION, info.flags, info.width, info.height, info.bpp,
+                       ORIENTATIONS.index(info.orientation),
+                       info.model.encode("ascii"), info.dither.encode("ascii"),
+                       bytes.fromhex(info.source_hash) if info.source_hash else b"",
+                       info.length)
+
+
+def unpack_header(data):
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated %s header: %d bytes" % (EXTENSION, len(data)))
+    (magic, version, flags, width, height, bpp, orientation,
+     model, dither, source_hash, length) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a %s file (magic %r)" % (EXTENSION, magic))
+    if version != VERSION:
+        raise ValueError("Unsupported %s version %d" % (EXTENSION, version))
+    if flags & ~FLAGS:
+        raise ValueError("Unsupported %s flags 0x%02x" % (EXTENSION, flags))
+    if length != width * height * bpp // 8:
+        raise ValueError("Payload length %d does not match %dx%d at %d bpp" % (length, width, height, bpp))
+    return BufferInfo(width, height, bpp, ORIENTATIONS[orientation], _text(model), _text(dither),
+                      source_hash.hex(), length, flags)
+
+
+def write(path, payload, model, width, height, bpp=4, orientation="landscape", dither="", source_hash="",
+          compress=False):
+    stored = payload
+    if compress:
+        stored = epdrle.encode(payload)
+        if len(stored) > PACKBITS_MAX_RATIO * len(payload):
+            logger.info("PackBits only shrinks %s to %d of %d bytes: storing it uncompressed"
+                        % (path, len(stored), len(payload)))
+            stored = payload
+            compress = False
+    flags = FLAG_PACKBITS if compress else 0
+    info = BufferInfo(width, height, bpp, orientation, model, dither, source_hash, len(payload), flags)
+    header = pack_header(info)
+    unpack_header(header)  # validate before touching the file
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(stored)
+    logger.debug("Panel buffer written: %s (%s, %d bytes stored)" % (path, info, len(stored)))
+    return info
+
+
+def read_header(f):
+    return unpack_header(f.read(HEADER.size))
+
+
+def read(path):
+    with open(path, "rb") as f:
+        info = read_header(f)
+        if info.flags & FLAG_PACKBITS:
+            return info, epdrle.decode(f.read(), info.length)
+        payload = f.read(info.length)
+    if len(payload) != info.length:
+        raise ValueError("Truncated %s payload: %d of %d bytes" % (path, len(payload), info.length))
+    return info, payload
+
+
+@contextlib.contextmanager
+def mapped(path):
+    # Memory-map a panel buffer file and yield (info, payload memoryview) without
+    # reading it into memory; info is None for a raw buffer without header. A
+    # compressed payload is yielded as an epdrle.PackBitsFrame over the mapping,
+    # expanded chunk by chunk as it is streamed. Only valid inside the with block.
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(MAGIC)] == MAGIC:
+                info = unpack_header(mm[:HEADER.size])
+                start = HEADER.size
+                if info.flags & FLAG_PACKBITS:
+                    end = len(mm)
+                elif len(mm) < start + info.length:
+                    raise ValueError("Truncated %s payload: %d of %d bytes" % (path, len(mm) - start, info.length))
+                else:
+                    end = start + info.length
+            else:
+                info, start, end = None, 0, len(mm)
+            view = memoryview(mm)[start:end]
+            frame = None
+            if info is not None and info.flags & FLAG_PACKBITS:
+                frame = epdrle.PackBitsFrame(view, info.length)
+            try:
+                yield info, frame if frame is not None else view
+            finally:
+                if frame is not None:
+                    frame.close()
+                view.release()
+
+### END OF FILE ###
@@ -1,13 +1,107 @@
 import os
+import functools
+import json
 import logging
-import sys
+import struct
+import threading
 import time
-import subprocess
 
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
+# Slice length of edge waits, so a level change racing the edge setup is never missed for long
+EDGE_WAIT_SLICE_MS = 1000
+
+
+# Per-board SPI settings (chunk_size defaults to the spidev bufsiz when readable).
+# Override them per board from a JSON file, e.g.
+#   {"RaspberryPi": {"max_speed_hz": 16000000, "chunk_size": 65536}}
+# at $EPD_SPI_CONFIG (default ~/.config/jihwa/spi.json), or with environment
+# variables EPD_SPI_BUS, EPD_SPI_DEVICE, EPD_SPI_MAX_SPEED_HZ, EPD_SPI_MODE and
+# EPD_SPI_CHUNK_SIZE, which take precedence over the file.
+SPI_PROFILES = {
+    "RaspberryPi": {"bus": 0, "device": 0, "max_speed_hz": 4000000, "mode": 0b00, "chunk_size": 4096},
+    "SunriseX3":   {"bus": 2, "device": 0, "max_speed_hz": 4000000, "mode": 0b00, "chunk_size": 4096},
+    "Mock":        {"bus": 0, "device": 0, "max_speed_hz": 4000000, "mode": 0b00, "chunk_size": 4096},
+}
+SPI_CONFIG_FILE = os.path.expanduser("~/.config/jihwa/spi.json")
+SPIDEV_BUFSIZ_FILE = "/sys/module/spidev/parameters/bufsiz"
+
+
+def _spidev_bufsiz(default):
+    # Largest single transfer the spidev driver accepts; bulk writes are chunked to it
+    try:
+        with open(SPIDEV_BUFSIZ_FILE, 'r') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return default
+
+
+def load_spi_profile(board, overrides=None):
+    profile = dict(SPI_PROFILES[board])
+    profile["chunk_size"] = _spidev_bufsiz(profile["chunk_size"])
+
+    config_file = os.environ.get("EPD_SPI_CONFIG", SPI_CONFIG_FILE)
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            file_overrides = json.load(f).get(board, {})
+        unknown = set(file_overrides) - set(profile)
+        if unknown:
+            raise ValueError("Unknown SPI settings in %s: %s" % (config_file, ", ".join(sorted(unknown))))
+        profile.update(file_overrides)
+
+    for key in profile:
+        value = os.environ.get("EPD_SPI_" + key.upper())
+        if value is not None:
+            profile[key] = int(value, 0)
+
+    # Per-panel settings (e.g. {"device": 1} for a second panel on CE1) win over everything
+    if overrides:
+        unknown = set(overrides) - set(profile)
+        if unknown:
+            raise ValueError("Unknown SPI settings: %s" % ", ".join(sorted(unknown)))
+        profile.update(overrides)
+
+    logger.debug("SPI profile for %s: %s" % (board, profile))
+    return profile
+
+
+# Panel pin names accepted by the backends, e.g. {"rst": 5, "dc": 6, "busy": 13, "pwr": 19}
+PIN_NAMES = {"rst": "RST_PIN", "dc": "DC_PIN", "cs": "CS_PIN", "busy": "BUSY_PIN", "pwr": "PWR_PIN"}
+
+
+def _set_pins(backend, pins):
+    # Instance pins shadow the class defaults, so several backends can drive
+    # panels wired to different GPIOs
+    unknown = set(pins or {}) - set(PIN_NAMES)
+    if unknown:
+        raise ValueError("Unknown pins: %s, expected %s" % (", ".join(sorted(unknown)), ", ".join(PIN_NAMES)))
+    for name, pin in (pins or {}).items():
+        setattr(backend, PIN_NAMES[name], int(pin))
+
+
+def _byte_view(data):
+    # Flat byte view of the payload so chunks can be sliced without copying
+    if isinstance(data, list):
+        data = bytes(data)
+    return memoryview(data).cast('B')
+
+
+def _edge_wait(gpio, pin, value, timeout):
+    # Jetson.GPIO / Hobot.GPIO: sleep in the kernel until the wanted edge arrives
+    edge = gpio.RISING if value else gpio.FALLING
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while gpio.input(pin) != value:
+        slice_ms = EDGE_WAIT_SLICE_MS
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            slice_ms = max(1, min(slice_ms, int(remaining * 1000)))
+        gpio.wait_for_edge(pin, edge, timeout=slice_ms)
+    return True
+
 
 class RaspberryPi:
     # Pin definition
@@ -19,11 +113,13 @@ class RaspberryPi:
     MOSI_PIN = 10
     SCLK_PIN = 11
 
-    def __init__(self):
+    def __init__(self, pins=None, spi=None):
         import spidev
         import gpiozero
         
+        _set_pins(self, pins)
         self.SPI = spidev.SpiDev()
+        self.spi_profile = load_spi_profile("RaspberryPi", spi)
         self.GPIO_RST_PIN    = gpiozero.LED(self.RST_PIN)
         self.GPIO_DC_PIN     = gpiozero.LED(self.DC_PIN)
         # self.GPIO_CS_PIN     = gpiozero.LED(self.CS_PIN)
@@ -66,6 +162,19 @@ class RaspberryPi:
         elif pin == self.PWR_PIN:
             return self.PWR_PIN.value
 
+    def digital_wait(self, pin, value, timeout=None):
+        # Block until the pin reads value; the BUSY line is woken by its edge interrupt
+        if pin == self.BUSY_PIN:
+            if value:
+                return self.GPIO_BUSY_PIN.wait_for_press(timeout)
+            return self.GPIO_BUSY_PIN.wait_for_release(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.digital_read(pin) != value:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self.delay_ms(5)
+        return True
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -73,7 +182,10 @@ class RaspberryPi:
         self.SPI.writebytes(data)
 
     def spi_writebyte2(self, data):
-        self.SPI.writebytes2(data)
+        view = _byte_view(data)
+        chunk_size = self.spi_profile["chunk_size"]
+        for offset in range(0, len(view), chunk_size):
+            self.SPI.writebytes2(view[offset:offset + chunk_size])
 
     def DEV_SPI_write(self, data):
         self.DEV_SPI.DEV_SPI_SendData(data)
@@ -94,9 +206,10 @@ class RaspberryPi:
                 '/usr/lib',
             ]
             self.DEV_SPI = None
+            # The library has to match the interpreter, so its pointer size decides
+            val = struct.calcsize("P") * 8
+            logger.debug("System is %d bit" % val)
             for find_dir in find_dirs:
-                val = int(os.popen('getconf LONG_BIT').read())
-                logging.debug("System is %d bit"%val)
                 if val == 64:
                     so_filename = os.path.join(find_dir, 'DEV_Config_64.so')
                 else:
@@ -105,15 +218,15 @@ class RaspberryPi:
                     self.DEV_SPI = CDLL(so_filename)
                     break
             if self.DEV_SPI is None:
-                RuntimeError('Cannot find DEV_Config.so')
+                raise RuntimeError('Cannot find DEV_Config.so')
 
             self.DEV_SPI.DEV_Module_Init()
 
         else:
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(0, 0)
-            self.SPI.max_speed_hz = 4000000
-            self.SPI.mode = 0b00
+            # SPI device, bus = 0, device = 0 unless the profile says otherwise
+            self.SPI.open(self.spi_profile["bus"], self.spi_profile["device"])
+            self.SPI.max_speed_hz = self.spi_profile["max_speed_hz"]
+            self.SPI.mode = self.spi_profile["mode"]
         return 0
 
     def module_exit(self, cleanup=False):
@@ -144,8 +257,9 @@ class JetsonNano:
     BUSY_PIN = 24
     PWR_PIN  = 18
 
-    def __init__(self):
+    def __init__(self, pins=None, spi=None):
         import ctypes
+        _set_pins(self, pins)   # software SPI: spi settings do not apply
         find_dirs = [
             os.path.dirname(os.path.realpath(__file__)),
             '/usr/local/lib',
@@ -169,6 +283,9 @@ class JetsonNano:
     def digital_read(self, pin):
         return self.GPIO.input(self.BUSY_PIN)
 
+    def digital_wait(self, pin, value, timeout=None):
+        return _edge_wait(self.GPIO, pin, value, timeout)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -214,12 +331,14 @@ class SunriseX3:
     PWR_PIN  = 18
     Flag     = 0
 
-    def __init__(self):
+    def __init__(self, pins=None, spi=None):
         import spidev
         import Hobot.GPIO
 
+        _set_pins(self, pins)
         self.GPIO = Hobot.GPIO
         self.SPI = spidev.SpiDev()
+        self.spi_profile = load_spi_profile("SunriseX3", spi)
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
@@ -227,6 +346,9 @@ class SunriseX3:
     def digital_read(self, pin):
         return self.GPIO.input(pin)
 
+    def digital_wait(self, pin, value, timeout=None):
+        return _edge_wait(self.GPIO, pin, value, timeout)
+
     def delay_ms(self, delaytime):
         time.sleep(delaytime / 1000.0)
 
@@ -236,7 +358,10 @@ class SunriseX3:
     def spi_writebyte2(self, data):
         # for i in range(len(data)):
         #     self.SPI.writebytes([data[i]])
-        self.SPI.xfer3(data)
+        view = _byte_view(data)
+        chunk_size = self.spi_profile["chunk_size"]
+        for offset in range(0, len(view), chunk_size):
+            self.SPI.xfer3(view[offset:offset + chunk_size])
 
     def module_init(self):
         if self.Flag == 0:
@@ -251,10 +376,10 @@ class SunriseX3:
 
             self.GPIO.output(self.PWR_PIN, 1)
         
-            # SPI device, bus = 0, device = 0
-            self.SPI.open(2, 0)
-            self.SPI.max_speed_hz = 4000000
-            self.SPI.mode = 0b00
+            # SPI device, bus = 2, device = 0 unless the profile says otherwise
+            self.SPI.open(self.spi_profile["bus"], self.spi_profile["device"])
+            self.SPI.max_speed_hz = self.spi_profile["max_speed_hz"]
+            self.SPI.mode = self.spi_profile["mode"]
             return 0
         else:
             return 0
@@ -272,22 +397,117 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
-
-if "Raspberry" in output:
-    implementation = RaspberryPi()
-elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
-    implementation = SunriseX3()
-else:
-    implementation = JetsonNano()
-
-for func in [x for x in dir(implementation) if not x.startswith('_')]:
-    setattr(sys.modules[__name__], func, getattr(implementation, func))
+def _mock_board(pins=None, spi=None):
+    # Recording simulated board and panel (see epdmock), never auto-detected
+    from . import epdmock
+    return epdmock.MockBoard(pins, spi)
+
+
+# Supported boards by name; EPD_BOARD=<name> skips detection
+BOARDS = {
+    "RaspberryPi": RaspberryPi,
+    "JetsonNano":  JetsonNano,
+    "SunriseX3":   SunriseX3,
+    "Mock":        _mock_board,
+}
+DEVICE_TREE_MODEL = "/proc/device-tree/model"
+CPUINFO_FILE = "/proc/cpuinfo"
+SUNRISE_X3_GPIO = "/sys/bus/platform/drivers/gpio-x3"
+JETSON_RELEASE_FILE = "/etc/nv_tegra_release"
+
+_implementation = None
+_implementation_lock = threading.Lock()
+
+
+def _read_text(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read().decode('ascii', 'replace')
+    except OSError:
+        return ""
+
+
+@functools.lru_cache(maxsize=None)
+def detect_board():
+    # Board name from EPD_BOARD, else from the device tree / cpuinfo read in
+    # process (no shell or subprocess); detected once per process
+    board = os.environ.get("EPD_BOARD")
+    if board:
+        if board not in BOARDS:
+            raise ValueError("Unknown EPD_BOARD %r, expected one of %s" % (board, ", ".join(BOARDS)))
+        return board
+
+    model = _read_text(DEVICE_TREE_MODEL)
+    if "Raspberry" in model or "Raspberry" in _read_text(CPUINFO_FILE):
+        return "RaspberryPi"
+    if os.path.exists(SUNRISE_X3_GPIO):
+        return "SunriseX3"
+    if "Jetson" in model or os.path.exists(JETSON_RELEASE_FILE):
+        return "JetsonNano"
+    raise RuntimeError("No supported e-Paper host board detected (model: %r); set EPD_BOARD to one of %s"
+                       % (model.rstrip("\0").strip(), ", ".join(BOARDS)))
+
+
+def get_implementation():
+    # Backend for the default wiring, created on first use rather than on import
+    global _implementation
+    with _implementation_lock:
+        if _implementation is None:
+            board = detect_board()
+            logger.debug("Hardware backend: %s" % board)
+            _implementation = BOARDS[board]()
+    return _implementation
+
+
+def __getattr__(name):
+    # Module level access (epdconfig.RST_PIN, epdconfig.digital_write(...), ...)
+    # is forwarded to the default backend, which is detected on the first such access
+    if name == "implementation":
+        return get_implementation()
+    if not name.startswith('_'):
+        implementation = get_implementation()
+        if hasattr(implementation, name):
+            return getattr(implementation, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def board_class(board):
+    # Backend class of a board name; BOARDS holds a lazy factory for the mock
+    if board == "Mock":
+        from . import epdmock
+        return epdmock.MockBoard
+    return BOARDS[board]
+
+
+def panel_wiring(pins=None, spi=None, board=None):
+    # GPIOs a backend with these overrides would claim and the SPI device it
+    # would open, worked out without creating it (nothing is claimed), e.g.
+    # {"rst": 17, "dc": 25, "busy": 24, "pwr": 18, "spi": (0, 0)}.
+    # Boards without an SPI profile drive chip select as a GPIO of their own.
+    board = board or detect_board()
+    backend = board_class(board)
+    names = ["rst", "dc", "busy", "pwr"]
+    if board not in SPI_PROFILES:
+        names.append("cs")
+    wiring = {name: int((pins or {}).get(name, getattr(backend, PIN_NAMES[name]))) for name in names}
+    if board in SPI_PROFILES:
+        profile = load_spi_profile(board, spi)
+        wiring["spi"] = (profile["bus"], profile["device"])
+    return wiring
+
+
+_backends = {}
+
+
+def get_backend(pins=None, spi=None):
+    # Hardware backend for one panel: the module-level implementation for the
+    # default wiring, otherwise a separate instance of the same board class
+    # with its own pins and SPI device, created once per wiring
+    if not pins and not spi:
+        return get_implementation()
+    key = (tuple(sorted((pins or {}).items())), tuple(sorted((spi or {}).items())))
+    if key not in _backends:
+        _backends[key] = BOARDS[detect_board()](pins, spi)
+    return _backends[key]
 
 ### END OF FILE ###
@@ -0,0 +1,164 @@
+import functools
+import logging
+
+import numpy as np
+from PIL import Image
+
+from . import epdpalette
+
+logger = logging.getLogger(__name__)
+
+# Error diffusion kernels as (dy, dx, weight)
+FLOYD_STEINBERG = ((0, 1, 7 / 16), (1, -1, 3 / 16), (1, 0, 5 / 16), (1, 1, 1 / 16))
+ATKINSON = ((0, 1, 1 / 8), (0, 2, 1 / 8), (1, -1, 1 / 8), (1, 0, 1 / 8), (1, 1, 1 / 8), (2, 0, 1 / 8))
+
+DIFFUSION_KERNELS = {
+    "floyd-steinberg": FLOYD_STEINBERG,
+    "atkinson": ATKINSON,
+}
+ORDERED_MODES = ("bayer", "blue-noise")
+# "pil" is PIL's built-in Floyd-Steinberg quantize, the driver's original behaviour
+DITHER_MODES = ("pil", "none") + tuple(DIFFUSION_KERNELS) + ORDERED_MODES
+DEFAULT_DITHER = "pil"
+# "pil" quantizes every band on its own, which leaves seams at band edges, so
+# frames rendered in row bands use this vectorized mode in its place; it keeps
+# its threshold pattern continuous across bands at about the cost of "pil"
+BANDED_PIL_DITHER = "blue-noise"
+
+# Peak-to-peak amplitude (in RGB units) of the ordered dither threshold offset
+ORDERED_SPREAD = 128.0
+BAYER_ORDER = 3          # 8 x 8 matrix
+BLUE_NOISE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=None)
+def bayer_matrix(order=BAYER_ORDER):
+    # Thresholds in (0, 1) of the recursive 2^order x 2^order Bayer matrix
+    m = np.zeros((1, 1))
+    for _ in range(order):
+        m = np.block([[4 * m, 4 * m + 2], [4 * m + 3, 4 * m + 1]])
+    return ((m + 0.5) / m.size).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def blue_noise(size=BLUE_NOISE_SIZE, seed=0, iterations=4):
+    # Tileable blue-noise thresholds in (0, 1): white noise pushed to high
+    # frequencies with a radial ramp filter, re-equalized after every pass
+    rng = np.random.default_rng(seed)
+    noise = rng.random((size, size))
+    fy = np.fft.fftfreq(size)[:, None]
+    fx = np.fft.fftfreq(size)[None, :]
+    ramp = np.sqrt(fx * fx + fy * fy)
+    for _ in range(iterations):
+        noise = np.real(np.fft.ifft2(np.fft.fft2(noise) * ramp))
+        noise = np.argsort(np.argsort(noise, axis=None)).reshape(size, size)
+        noise = (noise + 0.5) / noise.size
+    return noise.astype(np.float32)
+
+
+@functools.lru_cache(maxsize=None)
+def _palette_image(palette):
+    # PIL palette image holding the panel colours, padded to 256 entries
+    pal_image = Image.new("P", (1, 1))
+    pal_image.putpalette(sum(palette, ()) + (0, 0, 0) * (256 - len(palette)))
+    return pal_image
+
+
+class Ditherer:
+    """Map RGB to panel palette indices, optionally fed in consecutive row bands.
+
+    Ordered modes are fully vectorized. Error diffusion walks the band along the
+    wavefronts x + 2y = t: every pixel on a wavefront only depends on pixels of
+    earlier wavefronts, so each step is a single vectorized quantize/scatter.
+    Error pushed below the current band is carried over to the next call.
+    The "pil" mode cannot carry error and dithers every band on its own (see
+    banded_mode). Error diffusion costs about w + 2h steps per band, so small
+    bands make it several times slower than one full-frame pass.
+    """
+
+    def __init__(self, mode="floyd-steinberg", lut=None, spread=ORDERED_SPREAD):
+        if mode not in DITHER_MODES:
+            raise ValueError("Unknown dither mode '%s', expected one of %s" % (mode, ", ".join(DITHER_MODES)))
+        self.mode = mode
+        self.lut = lut if lut is not None else epdpalette.get_lut()
+        self.palette = self.lut.palette.astype(np.float32)
+        self.spread = spread
+        self.reset()
+
+    def reset(self):
+        self.row = 0
+        self.carry = None
+
+    def __call__(self, rgb):
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        if self.mode == "pil":
+            indices = self._pil(rgb)
+        elif self.mode == "none":
+            indices = self.lut.quantize(rgb)
+        elif self.mode in ORDERED_MODES:
+            indices = self._ordered(rgb)
+        else:
+            indices = self._diffuse(rgb, DIFFUSION_KERNELS[self.mode])
+        self.row += rgb.shape[0]
+        return indices
+
+    # PIL picks the nearest colour by its own RGB distance: only lut.palette is
+    # used, so the LUT's colour metric (e.g. "lab") has no effect in this mode
+    def _pil(self, rgb):
+        palette = tuple(tuple(int(c) for c in color) for color in self.lut.palette)
+        quantized = Image.fromarray(rgb, "RGB").quantize(palette=_palette_image(palette))
+        return np.asarray(quantized)
+
+    def _ordered(self, rgb):
+        thresholds = bayer_matrix() if self.mode == "bayer" else blue_noise()
+        n = thresholds.shape[0]
+        h, w = rgb.shape[:2]
+        rows = (self.row + np.arange(h)) % n
+        cols = np.arange(w) % n
+        offset = (thresholds[rows[:, None], cols[None, :]] - 0.5) * self.spread
+        values = np.clip(rgb + offset[..., None], 0, 255)
+        return self.lut.quantize((values + 0.5).astype(np.uint8))
+
+    def _diffuse(self, rgb, kernel):
+        h, w = rgb.shape[:2]
+        depth = max(dy for dy, _, _ in kernel)
+        pad = max(abs(dx) for _, dx, _ in kernel)
+        stride = w + 2 * pad
+
+        # Extra rows at the bottom collect the error owed to the next band, and
+        # the padding columns swallow error pushed off the left/right edges
+        work = np.zeros((h + depth, stride, 3), dtype=np.float32)
+        work[:h, pad:pad + w] = rgb
+        if self.carry is not None:
+            work[:depth, pad:pad + w] += self.carry
+        flat = work.reshape(-1, 3)
+        taps = [(dy * stride + dx, weight) for dy, dx, weight in kernel]
+        out = np.empty((h, w), dtype=np.uint8)
+
+        for t in range(w + 2 * (h - 1)):
+            ys = np.arange(max(0, (t - w + 2) // 2), min(h - 1, t // 2) + 1)
+            xs = t - 2 * ys
+            pos = ys * stride + (xs + pad)
+
+            values = np.clip(flat[pos], 0, 255)
+            indices = self.lut.quantize((values + 0.5).astype(np.uint8))
+            out[ys, xs] = indices
+            error = values - self.palette[indices]
+
+            for offset, weight in taps:
+                flat[pos + offset] += error * weight
+
+        self.carry = work[h:, pad:pad + w].copy()
+        return out
+
+
+def banded_mode(mode):
+    # Dither mode actually used when a frame is rendered in row bands
+    return BANDED_PIL_DITHER if mode == "pil" else mode
+
+
+def dither(rgb, mode=DEFAULT_DITHER, lut=None):
+    # Dither a whole (height, width, 3) RGB frame to palette indices
+    return Ditherer(mode, lut)(rgb)
+
+### END OF FILE ###
@@ -0,0 +1,186 @@
+import collections
+import logging
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from . import epdconfig
+from . import epdmodels
+from . import epdpack
+
+logger = logging.getLogger(__name__)
+
+# Panel simulated by the mock backend (EPD_MOCK_MODEL overrides it)
+MOCK_MODEL = "epd7in3f"
+# BUSY time (ms) the simulated panel reports after reset and per refresh phase.
+# Short by default so runs stay fast; EPD_MOCK_BUSY_MS="refresh=30000,power_on=100"
+# overrides single phases, e.g. to reproduce the real ~30 s refresh
+MOCK_BUSY_MS = {"reset": 1, "power_on": 50, "refresh": 200, "power_off": 20}
+# Simulated SPI clock (Hz) for transfer timing; 0 transfers instantly.
+# EPD_MOCK_SPI_HZ=4000000 makes a 192 KB frame take as long as on the wire
+MOCK_SPI_HZ = 0
+# Recorded GPIO writes and SPI transfers kept (oldest dropped first)
+MOCK_LOG_LIMIT = 100000
+
+
+def parse_busy_ms(spec):
+    # "refresh=30000,power_on=100" -> {"refresh": 30000.0, "power_on": 100.0}
+    busy_ms = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        phase, _, ms = item.partition("=")
+        try:
+            busy_ms[phase.strip()] = float(ms)
+        except ValueError:
+            raise ValueError("Bad BUSY time %r, expected phase=ms" % item)
+    return busy_ms
+
+
+class MockBoard:
+    """Simulated host board with a panel attached, selected with EPD_BOARD=Mock.
+
+    Records every GPIO write and SPI transfer, decodes the SPI stream into
+    controller commands, holds BUSY for the configured time after reset and
+    after every refresh phase command, and rebuilds the image the panel would
+    show from the frame RAM written before the refresh command. With
+    EPD_MOCK_OUTPUT set, that image is saved to the given file on every refresh.
+    With spi_hz (EPD_MOCK_SPI_HZ) set, every transfer takes its time on the wire.
+    """
+
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+
+    def __init__(self, pins=None, spi=None, model=None, busy_ms=None, output=None, spi_hz=None):
+        epdconfig._set_pins(self, pins)
+        self.spi_profile = epdconfig.load_spi_profile("Mock", spi)
+        self.model = epdmodels.MODELS[model or os.environ.get("EPD_MOCK_MODEL", MOCK_MODEL)]
+        self.busy_ms = dict(MOCK_BUSY_MS)
+        self.busy_ms.update(busy_ms if busy_ms is not None else parse_busy_ms(os.environ.get("EPD_MOCK_BUSY_MS", "")))
+        self.output = output if output is not None else os.environ.get("EPD_MOCK_OUTPUT", "")
+        self.spi_hz = spi_hz if spi_hz is not None else float(os.environ.get("EPD_MOCK_SPI_HZ", MOCK_SPI_HZ))
+        # Refresh phase started by each command byte, e.g. {0x12: "refresh"}
+        self.phases = {command: phase for command, _, phase in self.model.refresh_sequence}
+        self.levels = {}
+        self.busy_until = 0.0
+        self.clear()
+
+    def clear(self):
+        self.start = time.monotonic()
+        # ("gpio", pin, value) and ("spi", dc, bytes) entries, each prefixed
+        # with the seconds since clear()
+        self.log = collections.deque(maxlen=MOCK_LOG_LIMIT)
+        # [command, parameter bytes] sent since the last module_init()
+        self.commands = []
+        self.ram = None
+        # Frame RAM at the last refresh command and the number of refreshes
+        self.frame = None
+        self.refreshes = 0
+        self.spi_bytes = 0
+
+    def busy_level(self):
+        idle = self.model.busy_idle
+        return idle if time.monotonic() >= self.busy_until else 1 - idle
+
+    def hold_busy(self, phase):
+        self.busy_until = time.monotonic() + self.busy_ms.get(phase, 0) / 1000.0
+
+    def digital_write(self, pin, value):
+        self.log.append((time.monotonic() - self.start, "gpio", pin, value))
+        if pin == self.RST_PIN and value and not self.levels.get(pin, 0):
+            self.hold_busy("reset")
+        self.levels[pin] = value
+
+    def digital_read(self, pin):
+        if pin == self.BUSY_PIN:
+            return self.busy_level()
+        return self.levels.get(pin, 0)
+
+    def digital_wait(self, pin, value, timeout=None):
+        # Sleeps until the simulated BUSY release instead of polling
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.digital_read(pin) != value:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                return False
+            wait = max(self.busy_until - now, 0.001)
+            if deadline is not None:
+                wait = min(wait, deadline - now)
+            time.sleep(wait)
+        return True
+
+    def delay_ms(self, delaytime):
+        time.sleep(delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        self.transfer(bytes(data))
+
+    def spi_writebyte2(self, data):
+        view = epdconfig._byte_view(data)
+        chunk_size = self.spi_profile["chunk_size"]
+        for offset in range(0, len(view), chunk_size):
+            self.transfer(bytes(view[offset:offset + chunk_size]))
+
+    def transfer(self, data):
+        dc = self.levels.get(self.DC_PIN, 0)
+        self.log.append((time.monotonic() - self.start, "spi", dc, data))
+        self.spi_bytes += len(data)
+        if self.spi_hz:
+            time.sleep(len(data) * 8 / self.spi_hz)
+        if not dc:
+            for command in data:
+                self.command(command)
+        elif self.commands:
+            self.commands[-1][1] += data
+
+    def command(self, command):
+        parameters = bytearray()
+        self.commands.append([command, parameters])
+        if command == self.model.frame_command:
+            self.ram = parameters
+        phase = self.phases.get(command)
+        if phase is None:
+            return
+        if phase == "refresh":
+            self.frame = bytes(self.ram) if self.ram is not None else None
+            self.refreshes += 1
+            if self.output:
+                self.save(self.output)
+        self.hold_busy(phase)
+
+    def image(self, palette=None):
+        # Image the panel shows after the last refresh (None before the first);
+        # palette indices the panel does not define are drawn as white
+        if self.frame is None:
+            return None
+        model = self.model
+        indices = epdpack.unpack(self.frame, model.width, model.height, model.bpp)
+        colors = np.array(palette or model.palette, dtype=np.uint8)
+        indices = np.where(indices < len(colors), indices, model.white)
+        return Image.fromarray(colors[indices])
+
+    def save(self, path):
+        try:
+            image = self.image()
+        except ValueError as e:
+            logger.warning("Cannot rebuild the displayed image: %s" % e)
+            return
+        if image is not None:
+            image.save(path)
+            logger.info("Mock panel image saved to %s (refresh %d)" % (path, self.refreshes))
+
+    def module_init(self, cleanup=False):
+        self.log.append((time.monotonic() - self.start, "module", "init"))
+        self.commands = []
+        self.ram = None
+        return 0
+
+    def module_exit(self, cleanup=False):
+        self.log.append((time.monotonic() - self.start, "module", "exit"))
+        logger.debug("mock module exit after %d SPI bytes" % self.spi_bytes)
+
+### END OF FILE ###
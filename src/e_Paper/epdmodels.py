@@ -0,0 +1,89 @@
+import collections
+import functools
+import importlib
+import logging
+
+from . import epdpalette
+
+logger = logging.getLogger(__name__)
+
+# Everything the generic driver (epdbase.EPD) needs to know about a panel
+#   name              driver name used on the command line and in .epdbuf headers
+#   width, height     panel scan resolution in pixels
+#   bpp               bits per pixel in the panel RAM
+#   palette           sRGB value of every panel colour, in panel index order
+#   white             palette index used by Clear()
+#   init_sequence     register setup sent after reset, as (command, parameters)
+#   init_delay_ms     delay between the post-reset BUSY release and the setup
+#   frame_command     command that starts the frame RAM write
+#   refresh_sequence  (command, parameters, phase) sent after the frame, each
+#                     followed by a BUSY wait recorded under phase
+#   sleep_sequence    (command, parameters) putting the panel into deep sleep
+#   busy_idle         level of the BUSY pin when the panel is idle
+EPDModel = collections.namedtuple(
+    "EPDModel", "name width height bpp palette white init_sequence init_delay_ms "
+                "frame_command refresh_sequence sleep_sequence busy_idle")
+
+# 7.3 inch 7 colour ACeP (E)
+EPD_7IN3F = EPDModel(
+    name="epd7in3f",
+    width=800,
+    height=480,
+    bpp=4,
+    palette=epdpalette.PALETTE_7COLOR,
+    white=1,
+    init_sequence=(
+        (0xAA, (0x49, 0x55, 0x20, 0x08, 0x09, 0x18)),   # CMDH
+        (0x01, (0x3F, 0x00, 0x32, 0x2A, 0x0E, 0x2A)),
+        (0x00, (0x5F, 0x69)),
+        (0x03, (0x00, 0x54, 0x00, 0x44)),
+        (0x05, (0x40, 0x1F, 0x1F, 0x2C)),
+        (0x06, (0x6F, 0x1F, 0x1F, 0x22)),
+        (0x08, (0x6F, 0x1F, 0x1F, 0x22)),
+        (0x13, (0x00, 0x04)),                       # IPC
+        (0x30, (0x3C,)),
+        (0x41, (0x00,)),                            # TSE
+        (0x50, (0x3F,)),
+        (0x60, (0x02, 0x00)),
+        (0x61, (0x03, 0x20, 0x01, 0xE0)),
+        (0x82, (0x1E,)),
+        (0x84, (0x00,)),
+        (0x86, (0x00,)),                            # AGID
+        (0xE3, (0x2F,)),
+        (0xE0, (0x00,)),                            # CCSET
+        (0xE6, (0x00,)),                            # TSSET
+    ),
+    init_delay_ms=30,
+    frame_command=0x10,
+    refresh_sequence=(
+        (0x04, (), "power_on"),                     # POWER_ON
+        (0x12, (0x00,), "refresh"),                 # DISPLAY_REFRESH
+        (0x02, (0x00,), "power_off"),               # POWER_OFF
+    ),
+    sleep_sequence=(
+        (0x07, (0xA5,)),                            # DEEP_SLEEP
+    ),
+    busy_idle=1,
+)
+
+MODELS = {model.name: model for model in (EPD_7IN3F,)}
+
+
+def register(model):
+    # Add or replace a panel descriptor at runtime
+    MODELS[model.name] = model
+    get_driver.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_driver(name):
+    # Resolve a panel name once to a driver factory: the generic descriptor
+    # driven EPD for registered models, otherwise the EPD class of a
+    # hand-written e_Paper.<name> module
+    if name in MODELS:
+        from . import epdbase   # imports numpy and PIL, so only when a driver is needed
+        logger.debug("Using the generic driver for %s" % name)
+        return functools.partial(epdbase.EPD, MODELS[name])
+    return importlib.import_module("." + name, __package__).EPD
+
+### END OF FILE ###
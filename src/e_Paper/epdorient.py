@@ -0,0 +1,59 @@
+import logging
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Transforms from a source image to panel scan order, decided once per frame
+IDENTITY = "identity"   # already width x height
+ROTATE = "rotate"       # height x width: rotate 90 degrees counter-clockwise
+FIT = "fit"             # any other size: rotate if needed, scale and letterbox
+
+FIT_BACKGROUND = (255, 255, 255)
+
+
+def plan(src_width, src_height, width, height):
+    if (src_width, src_height) == (width, height):
+        return IDENTITY
+    if (src_width, src_height) == (height, width):
+        return ROTATE
+    return FIT
+
+
+def orient(rgb, width, height, background=FIT_BACKGROUND):
+    # Bring an (h, w, 3) array into panel scan order with the single transform
+    # chosen by plan(). Identity and rotation return views, so the rotation is
+    # folded into the quantizer's read instead of costing a full-frame copy.
+    rgb = np.asarray(rgb)
+    transform = plan(rgb.shape[1], rgb.shape[0], width, height)
+    if transform == IDENTITY:
+        return rgb
+    if transform == ROTATE:
+        return np.rot90(rgb)
+    return fit(rgb, width, height, background)
+
+
+def fit(rgb, width, height, background=FIT_BACKGROUND):
+    # Scale an image of unexpected size into the panel, keeping its aspect
+    # ratio; a portrait image on a landscape panel (or the reverse) is rotated
+    # first, and the unused border is filled with background
+    src_height, src_width = rgb.shape[:2]
+    source = "%d x %d" % (src_width, src_height)
+    if (src_height > src_width) != (height > width):
+        rgb = np.rot90(rgb)
+        src_height, src_width = src_width, src_height
+    scale = min(width / src_width, height / src_height)
+    size = (max(1, round(src_width * scale)), max(1, round(src_height * scale)))
+    logger.warning("Image is %s, fitting it into the %d x %d panel as %d x %d"
+                   % (source, width, height, size[0], size[1]))
+
+    resized = Image.fromarray(np.ascontiguousarray(rgb[..., :3])).resize(size, Image.LANCZOS)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[:] = background
+    top = (height - size[1]) // 2
+    left = (width - size[0]) // 2
+    frame[top:top + size[1], left:left + size[0]] = np.asarray(resized)
+    return frame
+
+### END OF FILE ###
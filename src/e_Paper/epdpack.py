@@ -0,0 +1,81 @@
+import functools
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def pack_4bpp(indices):
+    # Pack palette indices (one per element, 0-15) into two pixels per byte,
+    # first pixel in the high nibble, as expected by the panel's RAM.
+    flat = np.asarray(indices, dtype=np.uint8).reshape(-1)
+    if flat.size % 2:
+        raise ValueError("Cannot pack an odd number of pixels: %d" % flat.size)
+
+    packed = np.left_shift(flat[0::2], 4)
+    packed |= flat[1::2]
+    return packed.tobytes()
+
+
+def pack(indices, bpp=4):
+    # Pack palette indices into bpp bits per pixel (1, 2, 4 or 8), first pixel
+    # in the most significant bits
+    if bpp == 4:
+        return pack_4bpp(indices)
+    flat = np.asarray(indices, dtype=np.uint8).reshape(-1)
+    if bpp == 8:
+        return flat.tobytes()
+    if bpp not in (1, 2):
+        raise ValueError("Unsupported bits per pixel: %d" % bpp)
+    per_byte = 8 // bpp
+    if flat.size % per_byte:
+        raise ValueError("Cannot pack %d pixels at %d bpp" % (flat.size, bpp))
+
+    pixels = flat.reshape(-1, per_byte)
+    packed = np.zeros(pixels.shape[0], dtype=np.uint8)
+    for i in range(per_byte):
+        packed |= np.left_shift(pixels[:, i], 8 - bpp * (i + 1))
+    return packed.tobytes()
+
+
+def unpack(buffer, width, height, bpp=4):
+    # Inverse of pack(): (height, width) palette indices from a packed frame
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    if bpp not in (1, 2, 4, 8):
+        raise ValueError("Unsupported bits per pixel: %d" % bpp)
+    if data.size * 8 != width * height * bpp:
+        raise ValueError("Frame of %d bytes does not hold %dx%d at %d bpp" % (data.size, width, height, bpp))
+    if bpp == 8:
+        return data.reshape(height, width).copy()
+    shifts = np.arange(8 - bpp, -1, -bpp, dtype=np.uint8)
+    return ((data[:, None] >> shifts) & ((1 << bpp) - 1)).reshape(height, width)
+
+
+def fill_byte(index, bpp=4):
+    # Packed byte holding palette index in every pixel slot, e.g. 0x11 for white at 4 bpp
+    return sum(index << (8 - bpp * (i + 1)) for i in range(8 // bpp))
+
+
+@functools.lru_cache(maxsize=None)
+def solid_frame(value, nbytes):
+    # Immutable frame filled with one packed byte (e.g. 0x11: white, white),
+    # built once per colour and size and streamed without a per-call allocation
+    return bytes((value,)) * nbytes
+
+
+@functools.lru_cache(maxsize=None)
+def pattern_frame(kind, colors, width, height, size=1, bpp=4):
+    # Cached 4bpp maintenance pattern cycling through the palette indices in
+    # colors: "stripes" are horizontal bands of size rows, "checkerboard" uses
+    # size x size cells
+    y, x = np.ogrid[:height, :width]
+    if kind == "stripes":
+        cells = np.broadcast_to(y // size, (height, width))
+    elif kind == "checkerboard":
+        cells = y // size + x // size
+    else:
+        raise ValueError("Unknown pattern '%s', expected 'stripes' or 'checkerboard'" % kind)
+    return pack(np.asarray(colors, dtype=np.uint8)[cells % len(colors)], bpp)
+
+### END OF FILE ###
@@ -0,0 +1,157 @@
+import functools
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Idealised sRGB values of the 7 colour ACeP panel, in panel index order
+#   0: BLACK, 1: WHITE, 2: GREEN, 3: BLUE, 4: RED, 5: YELLOW, 6: ORANGE
+PALETTE_7COLOR = (
+    (0, 0, 0),
+    (255, 255, 255),
+    (0, 255, 0),
+    (0, 0, 255),
+    (255, 0, 0),
+    (255, 255, 0),
+    (255, 128, 0),
+)
+
+# Approximate sRGB appearance of the printed pigments, measured off a 7.3" ACeP panel
+PALETTE_7COLOR_MEASURED = (
+    (57, 48, 57),
+    (255, 255, 255),
+    (58, 91, 70),
+    (61, 59, 94),
+    (156, 72, 75),
+    (208, 190, 71),
+    (177, 106, 73),
+)
+
+PANEL_PALETTES = {
+    "ideal": PALETTE_7COLOR,
+    "measured": PALETTE_7COLOR_MEASURED,
+}
+COLOR_METRICS = ("rgb", "lab")
+
+# Bits kept per RGB channel when indexing the lookup table
+LUT_BITS = 6
+LUT_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# D65 reference white
+_XYZ_WHITE = np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+_RGB_TO_XYZ = np.array([
+    [0.4124564, 0.3575761, 0.1804375],
+    [0.2126729, 0.7151522, 0.0721750],
+    [0.0193339, 0.1191920, 0.9503041],
+], dtype=np.float32)
+
+
+def load_palette(spec):
+    # Resolve a palette by name ("ideal", "measured") or from a JSON file holding
+    # one [r, g, b] entry per panel colour, in panel index order
+    if spec in PANEL_PALETTES:
+        return PANEL_PALETTES[spec]
+    if not os.path.exists(spec):
+        raise ValueError("Unknown palette '%s', expected %s or a JSON file" % (spec, ", ".join(PANEL_PALETTES)))
+
+    with open(spec, 'r', encoding='utf-8') as f:
+        colors = json.load(f)
+    palette = tuple(tuple(int(c) for c in color) for color in colors)
+    if len(palette) != len(PALETTE_7COLOR) or any(len(color) != 3 for color in palette):
+        raise ValueError("Palette file %s must hold %d [r, g, b] entries" % (spec, len(PALETTE_7COLOR)))
+    return palette
+
+
+def srgb_to_lab(rgb):
+    # Convert (..., 3) sRGB values in 0-255 to CIELAB (D65)
+    c = np.asarray(rgb, dtype=np.float32) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    xyz = (linear @ _RGB_TO_XYZ.T) / _XYZ_WHITE
+
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+
+class PaletteLUT:
+    """RGB -> palette index lookup table, built once and persisted next to the driver.
+
+    With metric="lab" the nearest colour is chosen by CIELAB distance; the costly
+    conversion is paid once at build time, so per-frame cost matches "rgb".
+    """
+
+    def __init__(self, palette=PALETTE_7COLOR, bits=LUT_BITS, cache_dir=LUT_DIR, metric="rgb"):
+        if not 1 <= bits <= 8:
+            raise ValueError("LUT bits per channel must be between 1 and 8, got %d" % bits)
+        if metric not in COLOR_METRICS:
+            raise ValueError("Unknown colour metric '%s', expected one of %s" % (metric, ", ".join(COLOR_METRICS)))
+        self.palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        self.bits = bits
+        self.metric = metric
+        self.shift = 8 - bits
+        self.path = os.path.join(cache_dir, "palette_lut_%s.npy" % self.key())
+        self.table = self._load_or_build()
+
+    def key(self):
+        digest = hashlib.sha1(self.palette.tobytes()).hexdigest()[:12]
+        return "%s_%db_%s" % (digest, self.bits, self.metric)
+
+    def _build(self):
+        # Nearest palette entry for the centre of every quantized RGB cell
+        levels = np.arange(1 << self.bits, dtype=np.float32) * (1 << self.shift)
+        levels += ((1 << self.shift) - 1) / 2.0
+        r, g, b = np.meshgrid(levels, levels, levels, indexing="ij")
+        cells = np.stack((r, g, b), axis=-1).reshape(-1, 1, 3)
+        palette = self.palette.astype(np.float32)
+        if self.metric == "lab":
+            cells = srgb_to_lab(cells)
+            palette = srgb_to_lab(palette)
+
+        dist = np.sum((cells - palette) ** 2, axis=-1)
+        return np.argmin(dist, axis=-1).astype(np.uint8)
+
+    def _load_or_build(self):
+        if os.path.exists(self.path):
+            try:
+                # Memory-mapped: pages are shared between processes and read on demand
+                table = np.asarray(np.load(self.path, mmap_mode="r"))
+                if table.shape == (1 << (3 * self.bits),):
+                    logger.debug("Palette LUT loaded: %s" % self.path)
+                    return table
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable palette LUT %s: %s" % (self.path, e))
+
+        table = self._build()
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, table)
+            os.replace(tmp_path, self.path)
+            logger.debug("Palette LUT saved: %s" % self.path)
+        except OSError as e:
+            logger.warning("Cannot persist palette LUT, keeping it in memory: %s" % e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return table
+
+    def quantize(self, rgb):
+        # Map an (..., 3) uint8 RGB array to palette indices with a single gather
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        index = (rgb[..., 0] >> self.shift).astype(np.uint32) << (2 * self.bits)
+        index |= (rgb[..., 1] >> self.shift).astype(np.uint32) << self.bits
+        index |= rgb[..., 2] >> self.shift
+        return self.table[index]
+
+
+@functools.lru_cache(maxsize=None)
+def get_lut(palette=PALETTE_7COLOR, bits=LUT_BITS, metric="rgb"):
+    return PaletteLUT(palette, bits, metric=metric)
+
+### END OF FILE ###
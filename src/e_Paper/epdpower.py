@@ -0,0 +1,67 @@
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Refresh phases timed by the driver, in the order they happen
+PHASES = ("reset", "init", "transfer", "power_on", "refresh", "power_off", "sleep")
+
+# Average module power draw (mW) per phase. Rough typical figures for the bare
+# panel and its HAT; measure your own module (e.g. with a USB power meter) and
+# override them per model from a JSON file such as
+#   {"epd7in3f": {"refresh": 65.0, "power_on": 40.0}}
+# at $EPD_POWER_MODEL (default ~/.config/jihwa/power.json)
+POWER_MODELS = {
+    "epd7in3f": {"reset": 1.0, "init": 1.0, "transfer": 5.0, "power_on": 30.0,
+                 "refresh": 50.0, "power_off": 10.0, "sleep": 0.01},
+}
+DEFAULT_POWER_MW = POWER_MODELS["epd7in3f"]
+POWER_MODEL_FILE = os.path.expanduser("~/.config/jihwa/power.json")
+
+
+def load_power_model(model):
+    power = dict(POWER_MODELS.get(model, DEFAULT_POWER_MW))
+    config_file = os.environ.get("EPD_POWER_MODEL", POWER_MODEL_FILE)
+    if os.path.exists(config_file):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            overrides = json.load(f).get(model, {})
+        unknown = set(overrides) - set(PHASES)
+        if unknown:
+            logger.warning("Power phases in %s not timed by the default driver: %s"
+                           % (config_file, ", ".join(sorted(unknown))))
+        power.update((phase, float(mw)) for phase, mw in overrides.items())
+    return power
+
+
+def refresh_record(model, phase_times, power, busy_times=None, transfer=None):
+    # Structured record of one refresh cycle: seconds and estimated energy
+    # (mJ = mW x s) per phase, and their totals
+    order = list(PHASES) + [phase for phase in phase_times if phase not in PHASES]
+    seconds = {phase: round(phase_times[phase], 4) for phase in order if phase in phase_times}
+    energy = {phase: round(power.get(phase, 0.0) * t, 3) for phase, t in seconds.items()}
+    record = {
+        "timestamp": time.time(),
+        "model": model,
+        "seconds": seconds,
+        "energy_mj": energy,
+        "total_seconds": round(sum(seconds.values()), 4),
+        "total_energy_mj": round(sum(energy.values()), 3),
+    }
+    if busy_times:
+        record["busy_seconds"] = {phase: round(t, 4) for phase, t in busy_times.items()}
+    if transfer:
+        record["transfer_bytes_per_s"] = round(transfer["bytes_per_s"], 1)
+    return record
+
+
+def append_record(path, record):
+    # One JSON object per line, so the log can be appended to and tailed
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+### END OF FILE ###
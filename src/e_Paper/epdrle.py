@@ -0,0 +1,153 @@
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# PackBits (TIFF / Apple) run-length coding of packed panel frames. At 4 bpp a
+# flat area of one colour is a run of one repeated byte (e.g. 0x11 for white),
+# so quantized art with large flat regions shrinks well; dithered noise costs
+# at most 1 extra byte per 128.
+#
+#   header n in 0..127     n + 1 literal bytes follow
+#   header n in 129..255   the next byte is repeated 257 - n times (2..128)
+#   header 128             no-op
+MAX_PACKET = 128
+# Runs shorter than this are cheaper to keep inside a literal packet
+MIN_RUN = 3
+# Decoded chunk size when the caller does not give one (the spidev default bufsiz)
+CHUNK_SIZE = 4096
+
+
+def _literal(out, data):
+    for offset in range(0, len(data), MAX_PACKET):
+        piece = data[offset:offset + MAX_PACKET]
+        out.append(len(piece) - 1)
+        out += piece
+
+
+def _repeat(out, value, count):
+    while count >= 2:
+        n = min(count, MAX_PACKET)
+        out.append(257 - n)
+        out.append(value)
+        count -= n
+    if count:
+        out.append(0)
+        out.append(value)
+
+
+def encode(payload):
+    # numpy is imported here so that reading and decoding buffers (e.g. the
+    # display_daemon.py client importing epdbuf) stays free of it
+    import numpy as np
+
+    data = np.frombuffer(payload, dtype=np.uint8)
+    out = bytearray()
+    if not len(data):
+        return bytes(out)
+
+    # Runs are found with numpy; only runs long enough to become repeat
+    # packets are visited in Python, the bytes between them go out as literals
+    starts = np.concatenate(([0], np.flatnonzero(data[1:] != data[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(data)))
+    long_runs = np.flatnonzero(lengths >= MIN_RUN)
+
+    raw = data.tobytes()
+    position = 0
+    for start, length in zip(starts[long_runs].tolist(), lengths[long_runs].tolist()):
+        if start > position:
+            _literal(out, raw[position:start])
+        _repeat(out, raw[start], length)
+        position = start + length
+    if position < len(raw):
+        _literal(out, raw[position:])
+    return bytes(out)
+
+
+def iter_decode(data, length, chunk_size=CHUNK_SIZE):
+    # Expand a PackBits stream into chunk_size pieces (the last one may be
+    # shorter) so a frame can be streamed to the panel without ever holding
+    # the decoded frame; raises ValueError unless it decodes to exactly length bytes
+    data = memoryview(data).cast("B")
+    try:
+        pending = bytearray()
+        produced = 0
+        i = 0
+        end = len(data)
+        while i < end:
+            header = data[i]
+            i += 1
+            if header < 128:
+                count = header + 1
+                if i + count > end:
+                    raise ValueError("PackBits literal packet runs past the end of the data")
+                pending += data[i:i + count]
+                i += count
+            elif header > 128:
+                if i >= end:
+                    raise ValueError("PackBits repeat packet runs past the end of the data")
+                count = 257 - header
+                pending += bytes((data[i],)) * count
+                i += 1
+            else:
+                continue
+
+            if produced + len(pending) > length:
+                raise ValueError("PackBits data decodes to more than %d bytes" % length)
+            while len(pending) >= chunk_size:
+                yield bytes(pending[:chunk_size])
+                del pending[:chunk_size]
+                produced += chunk_size
+
+        if pending:
+            yield bytes(pending)
+            produced += len(pending)
+        if produced != length:
+            raise ValueError("PackBits data decodes to %d bytes, expected %d" % (produced, length))
+    finally:
+        # Drop the view at once so a memory map under it can be closed
+        data.release()
+
+
+def decode(data, length):
+    return b"".join(iter_decode(data, length, max(length, 1)))
+
+
+class PackBitsFrame:
+    """Compressed panel frame that is only ever expanded chunk by chunk.
+
+    len() is the decoded frame size, so it can stand in for a packed buffer
+    wherever only the size is checked; chunks() feeds EPD.send_frame_stream.
+    """
+
+    def __init__(self, data, length):
+        self.data = data
+        self.length = length
+        self.streams = []
+
+    def __len__(self):
+        return self.length
+
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        stream = iter_decode(self.data, self.length, chunk_size)
+        self.streams.append(stream)
+        return stream
+
+    def close(self):
+        # Finish streams abandoned half way (e.g. on an SPI error) so they no
+        # longer reference the data
+        for stream in self.streams:
+            stream.close()
+        self.streams = []
+
+    def digest(self):
+        # SHA-256 of the decoded frame, equal to that of the uncompressed buffer
+        h = hashlib.sha256()
+        for chunk in self.chunks():
+            h.update(chunk)
+        return h.hexdigest()
+
+    def ratio(self):
+        return self.length / len(self.data) if len(self.data) else float("inf")
+
+### END OF FILE ###
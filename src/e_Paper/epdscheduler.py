@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PanelScheduler:
+    """Refresh several panels from one host with overlapping BUSY periods.
+
+    Every write to a panel holds the lock of its SPI bus: init and the frame
+    transfer as one block, then each refresh and deep sleep command on its
+    own, so no command lands in the middle of another panel's frame. The BUSY
+    waits and the deep sleep settle in between only watch the panel's own BUSY
+    line and run concurrently. N panels then take about one refresh plus N
+    transfers.
+    """
+
+    def __init__(self):
+        self.bus_locks = {}
+        self.timings = {}
+
+    def bus_lock(self, epd):
+        profile = getattr(epd.hw, "spi_profile", None) or {}
+        bus = profile.get("bus", 0)
+        if bus not in self.bus_locks:
+            self.bus_locks[bus] = asyncio.Lock()
+        return self.bus_locks[bus]
+
+    async def show(self, name, epd, buffer):
+        start = time.monotonic()
+        async with self.bus_lock(epd):
+            if await epd.init_async() != 0:
+                raise RuntimeError("Failed to initialize panel %s" % name)
+            await asyncio.get_running_loop().run_in_executor(None, epd.send_frame, buffer)
+        sent = time.monotonic()
+        await epd.TurnOnDisplay_async(bus_lock=self.bus_lock(epd))
+        await epd.sleep_async(bus_lock=self.bus_lock(epd))
+        self.timings[name] = {"transfer": sent - start, "total": time.monotonic() - start}
+        logger.info("Panel %s: frame sent after %.2f s, done after %.2f s"
+                    % (name, self.timings[name]["transfer"], self.timings[name]["total"]))
+
+    async def show_all(self, jobs):
+        # jobs: iterable of (name, epd, buffer); failures are returned per panel
+        # instead of cancelling the refreshes already under way
+        jobs = list(jobs)
+        start = time.monotonic()
+        results = await asyncio.gather(*(self.show(name, epd, buffer) for name, epd, buffer in jobs),
+                                       return_exceptions=True)
+        logger.info("%d panels refreshed in %.2f s" % (len(jobs), time.monotonic() - start))
+        return {name: result for (name, _, _), result in zip(jobs, results)}
+
+
+def show_all(jobs):
+    # Blocking entry point for scripts without an event loop
+    return asyncio.run(PanelScheduler().show_all(jobs))
+
+### END OF FILE ###
@@ -0,0 +1,126 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Hardware backend calls recorded by Tracer.attach(), with the trace category
+BACKEND_CALLS = {
+    "digital_write": "gpio",
+    "digital_read": "gpio",
+    "digital_wait": "busy",
+    "delay_ms": "delay",
+    "spi_writebyte": "spi",
+    "spi_writebyte2": "spi",
+    "module_init": "module",
+    "module_exit": "module",
+}
+# EPD driver methods recorded as enclosing spans
+EPD_CALLS = (
+    "reset", "init", "ReadBusyH", "send_frame", "send_frame_stream", "TurnOnDisplay", "display",
+    "display_stream", "Clear", "sleep", "finish_sleep",
+    "reset_async", "init_async", "ReadBusyH_async", "TurnOnDisplay_async", "display_async",
+    "Clear_async", "sleep_async",
+)
+
+
+def _describe(name, args):
+    # Small, JSON friendly summary of the call arguments
+    if name == "digital_write" and len(args) == 2:
+        return {"pin": args[0], "value": args[1]}
+    if name in ("digital_read", "digital_wait") and args:
+        return {"pin": args[0]}
+    if name.startswith("spi_writebyte") and args:
+        return {"bytes": len(args[0])}
+    if name == "delay_ms" and args:
+        return {"ms": args[0]}
+    if name.startswith("ReadBusyH") and args:
+        return {"phase": args[0]}
+    return {}
+
+
+class Tracer:
+    """Opt-in recorder of GPIO/SPI calls and EPD phases in Chrome trace format.
+
+    attach() replaces the traced functions on the backend and the EPD object
+    with timing wrappers and detach() puts the originals back, so a driver
+    that is not being traced runs exactly the untraced code. Open the saved
+    JSON in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.events = []
+        self.threads = {}
+        self._patched = []
+
+    def record(self, name, category, start, end, args=None):
+        tid = threading.get_ident()
+        if tid not in self.threads:
+            self.threads[tid] = threading.current_thread().name
+        self.events.append({"name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": tid,
+                            "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6,
+                            "args": args or {}})
+
+    def _wrap(self, name, category, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def traced_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(name, category, start, time.perf_counter(), _describe(name, args))
+            return traced_async
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, category, start, time.perf_counter(), _describe(name, args))
+        return traced
+
+    def _patch(self, target, names, category_of):
+        for name in names:
+            if not hasattr(target, name):
+                continue
+            own = name in vars(target)
+            original = getattr(target, name)
+            self._patched.append((target, name, own, vars(target).get(name)))
+            setattr(target, name, self._wrap(name, category_of(name), original))
+
+    def attach(self, epd):
+        # Trace an EPD object and the hardware backend it talks to
+        self._patch(epd.hw, BACKEND_CALLS, BACKEND_CALLS.get)
+        self._patch(epd, EPD_CALLS, lambda name: "epd")
+        return self
+
+    def detach(self):
+        for target, name, own, original in reversed(self._patched):
+            if own:
+                setattr(target, name, original)
+            else:
+                delattr(target, name)
+        self._patched = []
+
+    def to_json(self):
+        pid = os.getpid()
+        metadata = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                    for tid, name in self.threads.items()]
+        return {"traceEvents": metadata + list(self.events), "displayTimeUnit": "ms"}
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f)
+        logger.info("Trace with %d events written to %s" % (len(self.events), path))
+
+### END OF FILE ###
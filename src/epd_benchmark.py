@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+"""
+E-Paper 드라이버 마이크로 벤치마크
+
+e-Paper 표시 경로의 핫스팟(버퍼 패킹 등)을 기존 구현과 비교하여 측정합니다.
+실제 디스플레이 없이 실행할 수 있습니다.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from e_Paper import epddither
+from e_Paper import epdpack
+from e_Paper import epdpalette
+from e_Paper import epdrle
+
+# 상수 정의
+PANEL_WIDTH = 800
+PANEL_HEIGHT = 480
+PANEL_COLORS = 7
+DEFAULT_REPEAT = 5
+
+# 로깅 설정
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+def time_call(func: Callable[[], Any], repeat: int) -> float:
+    """
+    함수를 여러 번 실행하여 가장 빠른 실행 시간을 측정합니다.
+
+    Args:
+        func: 측정할 함수 (인자 없음)
+        repeat: 반복 횟수
+
+    Returns:
+        최소 실행 시간 (초)
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_indices(width: int = PANEL_WIDTH, height: int = PANEL_HEIGHT, seed: int = 0) -> np.ndarray:
+    """
+    패널 팔레트 인덱스로 이루어진 무작위 프레임을 생성합니다.
+
+    Args:
+        width: 프레임 너비
+        height: 프레임 높이
+        seed: 난수 시드
+
+    Returns:
+        (height, width) 형태의 uint8 인덱스 배열
+    """
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, PANEL_COLORS, size=(height, width), dtype=np.uint8)
+
+
+def legacy_pack(buf_7color: bytearray, width: int = PANEL_WIDTH, height: int = PANEL_HEIGHT) -> List[int]:
+    """
+    기존 EPD.getbuffer의 순수 파이썬 4비트 패킹 루프 (비교 기준)
+
+    Args:
+        buf_7color: 픽셀당 1바이트 팔레트 인덱스
+        width: 프레임 너비
+        height: 프레임 높이
+
+    Returns:
+        패킹된 바이트 값 리스트
+    """
+    buf = [0x00] * int(width * height / 2)
+    idx = 0
+    for i in range(0, len(buf_7color), 2):
+        buf[idx] = (buf_7color[i] << 4) + buf_7color[i+1]
+        idx += 1
+    return buf
+
+
+def bench_pack(repeat: int) -> Dict[str, float]:
+    """
+    4비트 니블 패킹을 기존 루프와 NumPy 구현으로 비교합니다.
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        구현별 최소 실행 시간 (초)
+    """
+    indices = random_indices()
+    raw = bytearray(indices.tobytes())
+
+    if bytes(legacy_pack(raw)) != epdpack.pack_4bpp(indices):
+        raise AssertionError("Packed buffers differ between implementations")
+
+    results = {
+        "legacy loop": time_call(lambda: legacy_pack(raw), repeat),
+        "numpy": time_call(lambda: epdpack.pack_4bpp(indices), repeat),
+    }
+    for name, seconds in results.items():
+        logger.info(f"pack [{name}]: {seconds * 1000:.2f} ms")
+    logger.info(f"pack speedup: {results['legacy loop'] / results['numpy']:.1f}x")
+    return results
+
+
+def random_rgb(width: int = PANEL_WIDTH, height: int = PANEL_HEIGHT, seed: int = 0) -> np.ndarray:
+    """
+    부드러운 그라디언트와 노이즈가 섞인 RGB 테스트 프레임을 생성합니다.
+
+    Args:
+        width: 프레임 너비
+        height: 프레임 높이
+        seed: 난수 시드
+
+    Returns:
+        (height, width, 3) 형태의 uint8 RGB 배열
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack((x * 255 / width, y * 255 / height, (x + y) * 255 / (width + height)), axis=-1)
+    noisy = base + rng.normal(0, 24, size=base.shape)
+    return np.clip(noisy, 0, 255).astype(np.uint8)
+
+
+def legacy_quantize(rgb: np.ndarray, dither: int = Image.NONE) -> np.ndarray:
+    """
+    기존 EPD.getbuffer처럼 매 호출마다 팔레트 이미지를 만들어 PIL로 양자화합니다.
+
+    Args:
+        rgb: (height, width, 3) 형태의 RGB 배열
+        dither: PIL 디더링 방식
+
+    Returns:
+        팔레트 인덱스 배열
+    """
+    pal_image = Image.new("P", (1, 1))
+    pal_image.putpalette(sum(epdpalette.PALETTE_7COLOR, ()) + (0, 0, 0) * 249)
+    quantized = Image.fromarray(rgb).convert("RGB").quantize(palette=pal_image, dither=dither)
+    return np.asarray(quantized)
+
+
+def bench_quantize(repeat: int) -> Dict[str, float]:
+    """
+    PIL 팔레트 양자화와 사전 계산된 LUT 양자화를 비교합니다.
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        구현별 최소 실행 시간 (초)
+    """
+    rgb = random_rgb()
+
+    start = time.perf_counter()
+    lut = epdpalette.get_lut()
+    logger.info(f"LUT ready in {(time.perf_counter() - start) * 1000:.2f} ms: {lut.path}")
+
+    agreement = np.mean(lut.quantize(rgb) == legacy_quantize(rgb))
+    logger.info(f"LUT vs PIL (no dither) agreement: {agreement * 100:.2f}%")
+
+    start = time.perf_counter()
+    lab_lut = epdpalette.get_lut(epdpalette.PALETTE_7COLOR_MEASURED, metric="lab")
+    logger.info(f"CIELAB LUT ready in {(time.perf_counter() - start) * 1000:.2f} ms: {lab_lut.path}")
+
+    results = {
+        "PIL quantize (dither)": time_call(lambda: legacy_quantize(rgb, Image.FLOYDSTEINBERG), repeat),
+        "PIL quantize (no dither)": time_call(lambda: legacy_quantize(rgb), repeat),
+        "LUT gather": time_call(lambda: lut.quantize(rgb), repeat),
+        "LUT gather (measured, CIELAB)": time_call(lambda: lab_lut.quantize(rgb), repeat),
+    }
+    for name, seconds in results.items():
+        logger.info(f"quantize [{name}]: {seconds * 1000:.2f} ms")
+    return results
+
+
+def bench_dither(repeat: int) -> Dict[str, float]:
+    """
+    디더링 엔진별 처리 속도(프레임 시간과 처리량)를 측정합니다.
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        엔진별 최소 실행 시간 (초)
+    """
+    rgb = random_rgb()
+    pixels = rgb.shape[0] * rgb.shape[1]
+    epddither.dither(rgb, "none")  # LUT 로드/생성은 측정에서 제외
+
+    results = {}
+    for mode in epddither.DITHER_MODES:
+        results[mode] = time_call(lambda: epddither.dither(rgb, mode), repeat)
+        logger.info(f"dither [{mode}]: {results[mode] * 1000:.2f} ms, "
+                    f"{pixels / results[mode] / 1e6:.2f} Mpx/s")
+    return results
+
+
+def render_dither(mode: str) -> str:
+    """
+    render_frame 경로가 사용하는 디더링 엔진 이름을 돌려줍니다.
+    (legacy는 PIL 자체 Floyd-Steinberg 양자화, full과 banded는 같은 엔진을 써서 두 경로를 그대로 비교)
+
+    Args:
+        mode: render_frame의 경로 이름
+
+    Returns:
+        디더링 엔진 이름
+    """
+    if mode == "legacy":
+        return "pil"
+    # 기본 디더링으로 밴드 표시를 할 때 실제로 쓰는 엔진
+    return epddither.banded_mode(epddither.DEFAULT_DITHER)
+
+
+def render_frame(mode: str, image: np.ndarray) -> int:
+    """
+    처리된(크롭/리사이즈된) 세로 이미지 하나를 패널 버퍼로 만듭니다.
+
+    Args:
+        mode: "legacy"(기존 getbuffer 경로), "full"(전체 프레임) 또는 "banded"(밴드 스트리밍)
+        image: (800, 480, 3) 형태의 BGR 이미지
+
+    Returns:
+        생성된 패널 버퍼 바이트 수
+    """
+    import cv2
+    import display_picture
+
+    if mode == "banded":
+        ditherer = epddither.Ditherer(render_dither(mode))
+        return sum(len(epdpack.pack_4bpp(ditherer(band)))
+                   for band in display_picture.iter_rgb_bands(image, display_picture.LOW_MEMORY_BAND_ROWS))
+
+    rgb = cv2.cvtColor(cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE), cv2.COLOR_BGR2RGB)
+    pil_image = Image.fromarray(rgb)
+    if mode == "legacy":
+        quantized = legacy_quantize(np.asarray(pil_image.convert("RGB")), Image.FLOYDSTEINBERG)
+        return len(legacy_pack(bytearray(quantized.tobytes())))
+    return len(epdpack.pack_4bpp(epddither.dither(np.asarray(pil_image.convert("RGB")), render_dither(mode))))
+
+
+def read_rss() -> Tuple[int, int]:
+    """
+    현재 프로세스의 RSS와 RSS 최대치(high-water mark)를 읽습니다. (Linux 전용)
+
+    Returns:
+        (현재 RSS, 최대 RSS) 바이트
+    """
+    status = {}
+    with open("/proc/self/status", 'r') as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.split()
+    return int(status["VmRSS"][0]) * 1024, int(status["VmHWM"][0]) * 1024
+
+
+def reset_peak_rss() -> None:
+    """
+    RSS 최대치를 현재 RSS로 초기화합니다. (Linux 4.0 이상, 실패하면 무시)
+    """
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+    except OSError as e:
+        logger.warning(f"Cannot reset peak RSS, RSS growth may be understated: {e}")
+
+
+def measure_memory(mode: str, results: Any) -> None:
+    """
+    새 프로세스에서 한 가지 경로의 최대 메모리 사용량을 측정합니다.
+    (모듈 로드와 LUT 준비 이후를 기준으로 tracemalloc 최대치와 RSS 최대치 증가분을 보고,
+    tracemalloc은 OpenCV/PIL 내부 버퍼를 추적하지 못하므로 RSS도 함께 확인)
+
+    Args:
+        mode: render_frame의 경로 이름
+        results: 결과를 돌려줄 multiprocessing 큐
+    """
+    image = random_rgb(PANEL_HEIGHT, PANEL_WIDTH)
+    # 모듈 로드와 LUT 준비는 측정에서 제외. 밴드 경로는 측정과 같은 밴드 반복자로 한 밴드만 처리하고
+    # (잘린 프레임은 epdorient의 맞춤 경로를 타므로), 나머지는 작은 프레임으로 미리 실행해
+    # 전체 프레임 크기의 할당이 측정 전에 힙에 남지 않도록 함
+    if mode == "banded":
+        import display_picture
+        band = next(display_picture.iter_rgb_bands(image, display_picture.LOW_MEMORY_BAND_ROWS))
+        epdpack.pack_4bpp(epddither.Ditherer(render_dither(mode))(band))
+    else:
+        render_frame(mode, image[:32])
+
+    reset_peak_rss()
+    baseline, _ = read_rss()
+    tracemalloc.start()
+    start = time.perf_counter()
+    render_frame(mode, image)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    _, rss_peak = read_rss()
+
+    results.put((mode, peak, rss_peak - baseline, elapsed))
+
+
+def bench_memory(repeat: int) -> Dict[str, float]:
+    """
+    기존 경로, 전체 프레임 경로, 밴드 스트리밍(--low_memory) 경로의 최대 메모리 사용량을 비교합니다.
+    각 경로는 RSS 최대치가 섞이지 않도록 별도 프로세스에서 실행하고, 경로마다 사용한 디더링 엔진을 함께 출력합니다.
+    (full과 banded는 같은 엔진을 써서 메모리 차이만 비교)
+
+    Args:
+        repeat: 사용하지 않음 (프로세스당 한 번 측정)
+
+    Returns:
+        경로별 tracemalloc 최대 할당량 (바이트)
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    results = {}
+    for mode in ("legacy", "full", "banded"):
+        worker = context.Process(target=measure_memory, args=(mode, queue))
+        worker.start()
+        name, peak, rss, elapsed = queue.get()
+        worker.join()
+        results[name] = peak
+        logger.info(f"memory [{name}, {render_dither(name)}]: tracemalloc peak {peak / 2**20:.2f} MiB, "
+                    f"RSS growth {rss / 2**20:.2f} MiB, {elapsed * 1000:.0f} ms")
+    logger.info(f"banded peak: {results['banded'] / results['full'] * 100:.1f}% of full frame, "
+                f"{results['banded'] / results['legacy'] * 100:.1f}% of legacy")
+    return results
+
+
+def flat_art_indices(width: int = PANEL_WIDTH, height: int = PANEL_HEIGHT, seed: int = 0) -> np.ndarray:
+    """
+    넓은 단색 영역으로 이루어진 포스터풍 프레임(양자화된 생성 아트와 비슷한 형태)을 만듭니다.
+
+    Args:
+        width: 프레임 너비
+        height: 프레임 높이
+        seed: 난수 시드
+
+    Returns:
+        (height, width) 형태의 uint8 인덱스 배열
+    """
+    rng = np.random.default_rng(seed)
+    indices = np.ones((height, width), dtype=np.uint8)
+    for _ in range(24):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        w, h = rng.integers(40, width // 2), rng.integers(40, height // 2)
+        indices[y:y + h, x:x + w] = rng.integers(0, PANEL_COLORS)
+    return indices
+
+
+def bench_rle(repeat: int) -> Dict[str, float]:
+    """
+    PackBits 버퍼 압축의 압축률과 인코딩/스트리밍 디코딩 처리량을 측정합니다.
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        프레임 종류별 압축률
+    """
+    frames = {
+        "flat art": flat_art_indices(),
+        "dithered photo": epddither.dither(random_rgb(), epddither.DEFAULT_DITHER),
+        "random": random_indices(),
+    }
+
+    results = {}
+    for name, indices in frames.items():
+        payload = epdpack.pack_4bpp(indices)
+        encoded = epdrle.encode(payload)
+        if epdrle.decode(encoded, len(payload)) != payload:
+            raise AssertionError(f"PackBits round trip failed for {name}")
+
+        def stream() -> None:
+            for _ in epdrle.iter_decode(encoded, len(payload)):
+                pass
+
+        encode_time = time_call(lambda: epdrle.encode(payload), repeat)
+        decode_time = time_call(stream, repeat)
+        results[name] = len(payload) / len(encoded)
+        logger.info(f"rle [{name}]: {len(payload)} -> {len(encoded)} bytes ({results[name]:.1f}x), "
+                    f"encode {encode_time * 1000:.2f} ms, "
+                    f"streaming decode {decode_time * 1000:.2f} ms ({len(payload) / decode_time / 1e6:.1f} MB/s)")
+    return results
+
+
+def count_bus_operations(func: Callable[[], Any]) -> Counter:
+    """
+    epdconfig의 GPIO 쓰기와 SPI 전송 호출 횟수를 세면서 함수를 실행합니다.
+
+    Args:
+        func: 측정할 함수 (인자 없음)
+
+    Returns:
+        함수 이름별 호출 횟수
+    """
+    from e_Paper import epdconfig
+
+    counts = Counter()
+    names = ("digital_write", "spi_writebyte", "spi_writebyte2")
+    # 모듈 속성이 아니라 모듈 __getattr__로 기본 백엔드에 전달되는 이름은 측정 후 속성을 지워서 원래대로 되돌림
+    own = {name: vars(epdconfig).get(name) for name in names}
+
+    def counted(name, original):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return original(*args, **kwargs)
+        return wrapper
+
+    try:
+        for name in names:
+            setattr(epdconfig, name, counted(name, getattr(epdconfig, name)))
+        func()
+    finally:
+        for name in names:
+            if own[name] is not None:
+                setattr(epdconfig, name, own[name])
+            elif name in vars(epdconfig):
+                delattr(epdconfig, name)
+    return counts
+
+
+def bench_init(repeat: int) -> Dict[str, float]:
+    """
+    초기화 레지스터 시퀀스를 바이트 단위 전송과 명령 단위 일괄 전송으로 비교합니다.
+    (SPI 버스를 사용하므로 e-Paper 모듈이 연결된 보드에서 실행해야 합니다)
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        방식별 최소 실행 시간 (초)
+    """
+    from e_Paper import epd7in3f, epdconfig
+
+    epd = epd7in3f.EPD()
+
+    def legacy_sequence():
+        for command, data in epd7in3f.INIT_SEQUENCE:
+            epd.send_command(command)
+            for value in data:
+                epd.send_data(value)
+
+    def batched_sequence():
+        for command, data in epd7in3f.INIT_SEQUENCE:
+            epd.send_command_with_data(command, data)
+
+    if epdconfig.module_init() != 0:
+        raise RuntimeError("Failed to initialize e-Paper module")
+    try:
+        results = {}
+        for name, sequence in (("per-byte", legacy_sequence), ("batched", batched_sequence)):
+            counts = count_bus_operations(sequence)
+            results[name] = time_call(sequence, repeat)
+            logger.info(f"init [{name}]: {results[name] * 1000:.2f} ms, "
+                        f"GPIO writes: {counts['digital_write']}, "
+                        f"SPI transfers: {counts['spi_writebyte'] + counts['spi_writebyte2']}")
+    finally:
+        epdconfig.module_exit()
+    return results
+
+
+def bench_mock(repeat: int) -> Dict[str, float]:
+    """
+    모의 백엔드(EPD_BOARD=Mock)로 드라이버의 init/display/Clear/sleep 경로를 실행해
+    패널 RAM에 기록된 프레임이 보낸 버퍼와 같은지 확인하고 표시 시간을 측정합니다. 하드웨어가 필요 없습니다.
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        단계별 최소 실행 시간 (초)
+
+    Raises:
+        AssertionError: 모의 패널에 기록된 프레임이나 명령이 기대와 다른 경우
+    """
+    os.environ["EPD_BOARD"] = "Mock"
+    from e_Paper import epdconfig, epdmodels
+
+    epdconfig.detect_board.cache_clear()
+    epd = epdmodels.get_driver("epd7in3f")()
+    board = epdconfig.get_implementation()
+    if type(board).__name__ != "MockBoard":
+        raise AssertionError(f"EPD_BOARD=Mock selected {type(board).__name__}")
+
+    indices = random_indices()
+    buffer = epdpack.pack(indices, epd.bpp)
+    if epd.init() != 0:
+        raise RuntimeError("Failed to initialize the mock panel")
+
+    results = {"display": time_call(lambda: epd.display(buffer), repeat)}
+    if board.frame != buffer:
+        raise AssertionError("Frame RAM after display() differs from the packed buffer")
+    if not np.array_equal(np.asarray(board.image()), np.asarray(epd.model.palette, dtype=np.uint8)[indices]):
+        raise AssertionError("Image rebuilt from the SPI stream differs from the source indices")
+
+    encoded = epdrle.encode(buffer)
+    results["display_stream"] = time_call(
+        lambda: epd.display_stream(epdrle.iter_decode(encoded, len(buffer), board.spi_profile["chunk_size"])), repeat)
+    if board.frame != buffer:
+        raise AssertionError("Frame RAM after display_stream() differs from the packed buffer")
+
+    results["Clear"] = time_call(epd.Clear, repeat)
+    white = epdpack.solid_frame(epdpack.fill_byte(epd.model.white, epd.bpp), epd.frame_bytes)
+    if board.frame != white:
+        raise AssertionError("Frame RAM after Clear() is not the solid white frame")
+
+    epd.sleep()
+    sleep_commands = [command for command, _ in epd.model.sleep_sequence]
+    if [command for command, _ in board.commands[-len(sleep_commands):]] != sleep_commands:
+        raise AssertionError("sleep() did not end with the deep sleep sequence")
+
+    for name, seconds in results.items():
+        logger.info(f"mock [{name}]: {seconds * 1000:.1f} ms (BUSY {sum(board.busy_ms.values()):.0f} ms simulated)")
+    logger.info(f"mock: frames verified after display, display_stream and Clear; "
+                f"transfer {epd.last_transfer['bytes_per_s'] / 1e6:.1f} MB/s")
+    return results
+
+
+def bench_pipeline(repeat: int) -> Dict[str, float]:
+    """
+    모의 백엔드(EPD_BOARD=Mock)에서 파이프라인 표시(--pipeline, force 없이)의 경과 시간을
+    같은 프레임을 렌더링한 뒤 refresh_display로 초기화/전송/갱신하는 순차 경로와 비교해 단계가 겹치는지 확인합니다.
+    (두 경로 모두 TurnOnDisplay와 상태 저장을 포함하므로, 차이는 주로 렌더링이 초기화/전송에 가려진 시간)
+    같은 입력을 다시 표시하면 패널을 건드리지 않고 건너뛰는지도 확인합니다.
+    (SPI 전송은 보드 프로파일의 클럭으로 시간을 흉내 내고, 갱신 단계가 측정에 섞이지 않도록
+    모의 패널의 BUSY 시간과 딥 슬립 대기는 0으로 둠)
+
+    Args:
+        repeat: 반복 횟수
+
+    Returns:
+        단계별 최소 실행 시간 (초)
+
+    Raises:
+        AssertionError: 파이프라인이 순차 실행보다 빠르지 않거나, 건너뛰기/프레임 내용이 기대와 다른 경우
+    """
+    os.environ["EPD_BOARD"] = "Mock"
+    import tempfile
+    import display_picture
+    from e_Paper import epdconfig, epdmodels
+
+    epdconfig.detect_board.cache_clear()
+    epd = epdmodels.get_driver("epd7in3f")()
+    board = epdconfig.get_implementation()
+    if type(board).__name__ != "MockBoard":
+        raise AssertionError(f"EPD_BOARD=Mock selected {type(board).__name__}")
+    board.busy_ms = dict.fromkeys(board.busy_ms, 0.0)
+    board.spi_hz = board.spi_profile["max_speed_hz"]
+    epd.sleep_settle_ms = 0
+
+    # 처리된(크롭/리사이즈된) 가로 BGR 이미지
+    image = random_rgb(PANEL_WIDTH, PANEL_HEIGHT)
+    lut = display_picture.panel_lut(epd)
+    panel_size = (epd.width, epd.height)
+
+    def render() -> bytes:
+        bands = display_picture.iter_rgb_bands(image, display_picture.DEFAULT_BAND_ROWS, panel_size)
+        return b"".join(epd.getbuffer_bands(bands, dither=display_picture.DEFAULT_DITHER, lut=lut))
+
+    buffer = render()
+    results = {
+        "render": time_call(render, repeat),
+        "init": time_call(epd.init, repeat),
+        "transfer": time_call(lambda: epd.send_frame(buffer), repeat),
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        state_file = os.path.join(directory, "state.json")
+
+        def serial() -> None:
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            display_picture.refresh_display(epd, render(), state_file=state_file, metrics_log="")
+
+        def pipelined() -> None:
+            if os.path.exists(state_file):
+                os.remove(state_file)
+            if not display_picture.refresh_display_pipelined(epd, image, state_file=state_file, metrics_log=""):
+                raise AssertionError("Pipelined display skipped a frame that was not displayed yet")
+
+        results["serial"] = time_call(serial, repeat)
+        results["pipeline"] = time_call(pipelined, repeat)
+        if board.frame != buffer:
+            raise AssertionError("Frame RAM after the pipelined display differs from the banded render")
+
+        refreshes, spi_bytes = board.refreshes, board.spi_bytes
+        if display_picture.refresh_display_pipelined(epd, image, state_file=state_file, metrics_log=""):
+            raise AssertionError("Pipelined display refreshed a frame that is already displayed")
+        if board.refreshes != refreshes or board.spi_bytes != spi_bytes:
+            raise AssertionError("Skipped pipelined display still wrote to the panel")
+
+    for name, seconds in results.items():
+        logger.info(f"pipeline [{name}]: {seconds * 1000:.1f} ms")
+    saved = results["serial"] - results["pipeline"]
+    logger.info(f"pipeline: wall {results['pipeline'] * 1000:.1f} ms vs {results['serial'] * 1000:.1f} ms in sequence "
+                f"({saved * 1000:.1f} ms saved, render alone {results['render'] * 1000:.1f} ms)")
+    if saved <= 0:
+        raise AssertionError("Pipelined display is not faster than render + init + transfer in sequence")
+    return results
+
+
+def parse_arguments() -> Dict[str, Any]:
+    """
+    명령줄 인수를 파싱합니다.
+
+    Returns:
+        파싱된 명령줄 인수 딕셔너리
+    """
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmarks for the e-Paper display path.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+
+    parser.add_argument(
+        "benchmark",
+        choices=["pack", "quantize", "dither", "memory", "init", "rle", "mock", "pipeline"],
+        help="Benchmark to run"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=DEFAULT_REPEAT,
+        help="Number of timed repetitions (the best run is reported)"
+    )
+
+    return vars(parser.parse_args())
+
+
+def main() -> int:
+    """
+    메인 실행 함수
+
+    Returns:
+        종료 코드 (0: 성공, 1: 오류)
+    """
+    args = parse_arguments()
+
+    benchmarks = {
+        "pack": bench_pack,
+        "quantize": bench_quantize,
+        "dither": bench_dither,
+        "memory": bench_memory,
+        "init": bench_init,
+        "rle": bench_rle,
+        "mock": bench_mock,
+        "pipeline": bench_pipeline,
+    }
+
+    try:
+        benchmarks[args["benchmark"]](args["repeat"])
+        return 0
+    except Exception as e:
+        logger.error(f"Benchmark failed: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())